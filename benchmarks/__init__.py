@@ -0,0 +1,3 @@
+# Benchmarks for the Git Branching Simulator. Run them from the repository
+# root, e.g. `python -m benchmarks.startup` for import cost or
+# `python -m benchmarks.suite` for operations on synthetic histories.
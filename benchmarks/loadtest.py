@@ -0,0 +1,116 @@
+# Load test for the multi-tenant server (server.py). Many sessions each run a
+# short branching workflow over a pool of connections; the result is the
+# command throughput and latency percentiles as JSON. Run from the
+# repository root against a running server, or let it start one:
+#   python -m benchmarks.loadtest --spawn-server --sessions 2000
+import os
+import sys
+import json
+import math
+import argparse
+import asyncio
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def workflow(rounds):
+    # A small branch-and-merge cycle per round, plus a log read
+    commands = []
+    for i in range(rounds):
+        commands += [f"commit work {i}", f"branch topic-{i}", f"checkout topic-{i}", f"commit topic {i}",
+                     "checkout master", f"commit main {i}", f"merge topic-{i}", "log -n 5"]
+    return commands
+
+async def run_connection(host, port, sessions, commands, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    try:
+        for command in commands:
+            # Interleave the sessions so consecutive requests hit different shards
+            for session in sessions:
+                start = time.perf_counter()
+                writer.write(json.dumps({'session': session, 'command': command}).encode() + b'\n')
+                await writer.drain()
+                response = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - start)
+                if 'error' in response or response.get('output', '').startswith('Error'):
+                    errors.append(response)
+        for session in sessions:
+            writer.write(json.dumps({'session': session, 'close': True}).encode() + b'\n')
+            await writer.drain()
+            await reader.readline()
+    finally:
+        writer.close()
+
+async def run_load(host, port, session_count, connection_count, rounds):
+    sessions = [f"loadtest-{i}" for i in range(session_count)]
+    commands = workflow(rounds)
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_connection(host, port, sessions[i::connection_count], commands, latencies, errors)
+                           for i in range(min(connection_count, session_count))))
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    def percentile(p):
+        # Nearest rank
+        return latencies[math.ceil(p * len(latencies)) - 1] * 1000
+    return {
+        'sessions': session_count,
+        'connections': connection_count,
+        'commands': len(latencies),
+        'errors': len(errors),
+        'first_errors': errors[:5],
+        'seconds': elapsed,
+        'commands_per_second': len(latencies) / elapsed,
+        'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+                       'max': latencies[-1] * 1000},
+    }
+
+def spawn_server(workers):
+    # Start server.py on a free port and wait for its "Serving ..." line
+    command = [sys.executable, os.path.join(ROOT, 'server.py'), '--port', '0']
+    if workers:
+        command += ['--workers', str(workers)]
+    process = subprocess.Popen(command, cwd=ROOT, stderr=subprocess.PIPE, text=True)
+    line = process.stderr.readline()
+    if not line.startswith('Serving'):
+        process.kill()
+        raise RuntimeError(f"server did not start: {line}")
+    host, port = line.split()[-1].rsplit(':', 1)
+    return process, host, int(port)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the simulator server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=3, help="branch/merge cycles per session")
+    parser.add_argument('--spawn-server', action='store_true', help="start a local server for the run")
+    parser.add_argument('--workers', type=int, help="shard processes for --spawn-server")
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    
+    process = None
+    host, port = args.host, args.port
+    if args.spawn_server:
+        process, host, port = spawn_server(args.workers)
+    try:
+        results = asyncio.run(run_load(host, port, args.sessions, args.connections, args.rounds))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each probe runs in a fresh interpreter so nothing is already imported
+PROBES = {
+    'interpreter': "pass",
+    'import_main': "import main",
+    'import_tk': "import main; main._import_tk()",
+    'import_matplotlib': "import main; main._import_matplotlib()",
+    'import_networkx': "import networkx",
+}
+
+def time_probe(code, repeat):
+    # Best of `repeat` runs: time spent in the probe code itself and for the
+    # whole interpreter process, plus the slowest imports of the last run
+    timer = "import time; t = time.perf_counter(); {code}; print(time.perf_counter() - t)"
+    probe_samples = []
+    process_samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', timer.format(code=code)],
+                                cwd=ROOT, capture_output=True, text=True)
+        process_samples.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None
+        probe_samples.append(float(result.stdout.strip()))
+    return {
+        'seconds': min(probe_samples),
+        'process_seconds': min(process_samples),
+        'slowest_imports': parse_importtime(result.stderr),
+    }
+
+def parse_importtime(stderr, top=10):
+    # `-X importtime` prints "import time: self [us] | cumulative | module"
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        modules.append((int(cumulative_us), int(self_us), module.strip()))
+    modules.sort(reverse=True)
+    return [{'module': module, 'cumulative_us': cumulative, 'self_us': own}
+            for cumulative, own, module in modules[:top]]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import cost of main.py and its GUI toolkits")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    
+    results = {'python': sys.version.split()[0], 'probes': {}}
+    for name, code in PROBES.items():
+        # Probes whose modules are not installed are reported as unavailable
+        results['probes'][name] = time_probe(code, args.repeat) or {'available': False}
+    
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# Benchmark suite: builds synthetic histories of several shapes and sizes and
+# times the repository operations on them, printing JSON so runs from
+# different versions can be compared. Run from the repository root:
+#   python -m benchmarks.suite --sizes 1000,10000,100000 --output results.json
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+import time
+
+import main as simulator
+from benchmarks.synthetic import SHAPES, generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def bench_log(repo):
+    seconds, log = timed(repo.get_commit_log)
+    first_page, _ = timed(repo.get_commit_log, 'first-parent', 20)
+    return {'seconds': seconds, 'first_page_seconds': first_page, 'lines': log.count('\n') + 1}
+
+def bench_persistence(repo, directory):
+    results = {}
+    for suffix in ('.json', simulator.BINARY_SUFFIX):
+        filename = os.path.join(directory, 'repo' + suffix)
+        save_seconds, _ = timed(repo.save_to_file, filename)
+        load_seconds, loaded = timed(simulator.GitRepository.load_from_file, filename)
+        if len(loaded.commits) != len(repo.commits):
+            raise RuntimeError(f"{filename} reloaded with {len(loaded.commits)} commits")
+        results[suffix.lstrip('.')] = {'save_seconds': save_seconds, 'load_seconds': load_seconds,
+                                       'bytes': os.path.getsize(filename)}
+    return results
+
+def bench_graph(repo):
+    try:
+        import networkx
+    except ImportError:
+        return {'available': False}
+    seconds, graph = timed(repo.build_graph)
+    return {'seconds': seconds, 'nodes': graph.number_of_nodes()}
+
+def bench_layout(repo):
+    layout = simulator.LaneLayout()
+    seconds, _ = timed(layout.compute, repo.commits)
+    return {'seconds': seconds, 'lanes': len(set(layout.lanes.values()))}
+
+def bench_render(repo):
+    # Offscreen Agg canvas: the same drawing work as the Tk canvas without a display
+    try:
+        simulator._import_matplotlib()
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+    except ImportError:
+        return {'available': False}
+    figure = simulator.Figure(figsize=(6, 4))
+    renderer = simulator.GraphRenderer(figure.add_subplot(), FigureCanvasAgg(figure))
+    positions = simulator.LaneLayout().compute(repo.commits)
+    seconds, _ = timed(renderer.render, repo, positions)
+    
+    # One more commit drawn incrementally on top of the cached layers
+    repo.create_commit("Render probe")
+    positions = simulator.LaneLayout().compute(repo.commits)
+    incremental, _ = timed(renderer.render, repo, positions)
+    return {'seconds': seconds, 'incremental_seconds': incremental}
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+def run_case(shape, size, seed, render_limit):
+    build_seconds, (repo, operations) = timed(generate, shape, size, seed)
+    case = {'shape': shape, 'size': size, 'commits': len(repo.commits), 'branches': len(repo.branches),
+            'build_seconds': build_seconds, 'operations': operations}
+    case['log'] = bench_log(repo)
+    with tempfile.TemporaryDirectory() as directory:
+        case['persistence'] = bench_persistence(repo, directory)
+    case['build_graph'] = bench_graph(repo)
+    case['layout'] = bench_layout(repo)
+    if size <= render_limit:
+        case['render'] = bench_render(repo)
+    else:
+        case['render'] = {'skipped': f"size above --render-limit {render_limit}"}
+    return case
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time repository operations on synthetic histories")
+    parser.add_argument('--shapes', default=','.join(SHAPES),
+                        help=f"comma-separated history shapes ({', '.join(SHAPES)})")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="comma-separated commit counts, e.g. 1000,10000,100000,1000000")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--render-limit', type=int, default=5000,
+                        help="skip rendering histories with more commits than this")
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+    
+    results = {'python': sys.version.split()[0], 'revision': git_revision(),
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': args.seed, 'cases': []}
+    for shape in args.shapes.split(','):
+        if shape not in SHAPES:
+            parser.error(f"unknown shape '{shape}'")
+        for size in args.sizes.split(','):
+            print(f"{shape} x {size}", file=sys.stderr)
+            results['cases'].append(run_case(shape, int(size), args.seed, args.render_limit))
+    
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# Synthetic repository histories for benchmarking. Histories are built through
+# GitRepository's own commands so generating them also exercises (and times)
+# create_commit, create_branch, checkout_branch and merge_branches.
+import random
+import time
+
+from main import GitRepository
+
+class OperationTimer:
+    # Accumulates call counts and wall time per repository operation
+    def __init__(self, repo):
+        self.repo = repo
+        self.totals = {}
+    
+    def __call__(self, name, *args):
+        start = time.perf_counter()
+        success, message = getattr(self.repo, name)(*args)
+        elapsed = time.perf_counter() - start
+        count, seconds = self.totals.get(name, (0, 0.0))
+        self.totals[name] = (count + 1, seconds + elapsed)
+        if not success:
+            raise RuntimeError(message)
+        return message
+    
+    def results(self):
+        return {name: {'calls': count, 'seconds': seconds, 'mean_us': seconds / count * 1e6}
+                for name, (count, seconds) in self.totals.items()}
+
+def linear(run, repo, commits, rng):
+    # One branch, one commit after another
+    while len(repo.commits) < commits:
+        run('create_commit', f"Commit {len(repo.commits)}")
+
+def feature_branches(run, repo, commits, rng):
+    # Many short-lived topic branches of 1-5 commits, each merged back into
+    # master; master often moves on in between so most merges are real merges
+    feature = 0
+    while len(repo.commits) < commits:
+        feature += 1
+        name = f"feature-{feature}"
+        run('create_branch', name)
+        run('checkout_branch', name)
+        for _ in range(rng.randint(1, 5)):
+            run('create_commit', f"Work on {name}")
+        run('checkout_branch', 'master')
+        if rng.random() < 0.7:
+            run('create_commit', f"Commit {len(repo.commits)} on master")
+        run('merge_branches', name, 'no-ff' if rng.random() < 0.5 else 'ff')
+
+def octopus(run, repo, commits, rng):
+    # Bursts of 3-8 branches from the same base, all merged into master.
+    # Merges here have two parents, so an octopus merge becomes a run of
+    # merge commits, one per branch.
+    burst = 0
+    while len(repo.commits) < commits:
+        burst += 1
+        names = [f"octo-{burst}-{arm}" for arm in range(rng.randint(3, 8))]
+        for name in names:
+            run('create_branch', name)
+        for name in names:
+            run('checkout_branch', name)
+            for _ in range(rng.randint(1, 3)):
+                run('create_commit', f"Work on {name}")
+        run('checkout_branch', 'master')
+        for name in names:
+            run('merge_branches', name, 'no-ff')
+
+SHAPES = {
+    'linear': linear,
+    'feature': feature_branches,
+    'octopus': octopus,
+}
+
+def generate(shape, commits, seed=0, content_ids=False):
+    # Returns the repository (with at least `commits` commits) and the
+    # timings of the operations used to build it
+    repo = GitRepository(content_ids=content_ids)
+    run = OperationTimer(repo)
+    SHAPES[shape](run, repo, commits, random.Random(seed))
+    return repo, run.results()
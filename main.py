@@ -1,21 +1,74 @@
 import os
 import sys
+import re
 import json
+import math
+import codecs
+import time
 import datetime
-import uuid
-import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
-import networkx as nx
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import mmap
+import heapq
+import hashlib
+import itertools
+import struct
+import functools
+import contextlib
+import tracemalloc
+import queue
+import threading
+from array import array
+from collections import deque
+from collections.abc import Mapping
+
+# The model classes only need the standard library. The GUI toolkits are
+# imported on first use: tkinter when the window is created and matplotlib
+# once the window is up and the graph panel is built.
+def _import_tk():
+    global tk, ttk, scrolledtext, messagebox
+    import tkinter as tk
+    from tkinter import ttk, scrolledtext, messagebox
+
+def _import_matplotlib():
+    global Figure, FigureCanvasTkAgg, LineCollection
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.collections import LineCollection
+
+def _to_epoch_us(dt):
+    return round(dt.timestamp() * 1000000)
+
+def _from_epoch_us(us):
+    seconds, micros = divmod(us, 1000000)
+    return datetime.datetime.fromtimestamp(seconds).replace(microsecond=micros)
 
 class GitCommit:
-    def __init__(self, commit_id, message, parent=None, second_parent=None):
-        self.id = commit_id
-        self.message = message
-        self.parent = parent
-        self.second_parent = second_parent
-        self.timestamp = datetime.datetime.now()
+    # Lightweight view of one record in a CommitStore; the commit data itself
+    # lives in the store's columns
+    __slots__ = ('store', 'index')
+    
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+    
+    @property
+    def id(self):
+        return self.store.id_of(self.index)
+    
+    @property
+    def message(self):
+        return self.store.messages[self.store.message_ids[self.index]]
+    
+    @property
+    def parent(self):
+        return self.store.id_of(self.store.parents[self.index])
+    
+    @property
+    def second_parent(self):
+        return self.store.id_of(self.store.second_parents[self.index])
+    
+    @property
+    def timestamp(self):
+        return _from_epoch_us(self.store.timestamps[self.index])
     
     def to_dict(self):
         return {
@@ -25,12 +78,453 @@ class GitCommit:
             'second_parent': self.second_parent,
             'timestamp': self.timestamp.isoformat()
         }
+
+def _pack_strings(strings):
+    offsets = array('q', [0])
+    heap = bytearray()
+    for string in strings:
+        heap += string.encode('utf-8')
+        offsets.append(len(heap))
+    return offsets, heap
+
+class _StringHeap:
+    # Read-only sequence of strings stored back to back in a UTF-8 buffer
+    def __init__(self, offsets, heap):
+        self.offsets = offsets
+        self.heap = heap
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self.heap[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+class CommitStore(Mapping):
+    # Column-oriented commit table. Commit i keeps its parents as indices
+    # (-1 for none), its timestamp as epoch microseconds and its message as an
+    # index into an interned string table, all in typed arrays. Ids of the
+    # form C<i> are implied by the index, so only other ids are stored.
+    # Reading it as a mapping of id -> GitCommit creates views on demand.
+    #
+    # Each commit also gets an ancestry index: its generation (1 + the
+    # largest parent generation), its depth along first parents and a
+    # skew-binary jump pointer to a first-parent ancestor, which lets any
+    # first-parent ancestor be reached in O(log n) steps.
+    def __init__(self):
+        self.parents = array('i')
+        self.second_parents = array('i')
+        self.timestamps = array('q')
+        self.message_ids = array('i')
+        self.generations = array('i')
+        self.depths = array('i')
+        self.jumps = array('i')
+        self.messages = []
+        self._message_index = {}
+        self._custom_ids = {}
+        self._custom_index = {}
+        self._prefix_buckets = {}
+        
+        # Children as linked lists threaded through two edge slots per commit
+        self._first_child_edge = array('i')
+        self._next_edge = array('i')
+    
+    def append(self, commit_id, message, parent=None, second_parent=None, timestamp=None):
+        if commit_id in self:
+            raise ValueError(f"Duplicate commit id {commit_id}")
+        if self._message_index is None:
+            self._materialize()
+        parent_index = self.index_of(parent)
+        second_parent_index = self.index_of(second_parent)
+        
+        index = len(self.parents)
+        if commit_id != f"C{index}":
+            self._add_custom_id(index, commit_id)
+        
+        message_id = self._message_index.get(message)
+        if message_id is None:
+            message_id = self._message_index[message] = len(self.messages)
+            self.messages.append(sys.intern(message))
+        
+        self.parents.append(parent_index)
+        self.second_parents.append(second_parent_index)
+        self.timestamps.append(time.time_ns() // 1000 if timestamp is None else timestamp)
+        self.message_ids.append(message_id)
+        self._index_ancestry(index, parent_index, second_parent_index)
+        
+        self._first_child_edge.append(-1)
+        self._next_edge.extend((-1, -1))
+        for slot, parent_index in enumerate((parent_index, second_parent_index)):
+            if parent_index >= 0:
+                edge = 2 * index + slot
+                self._next_edge[edge] = self._first_child_edge[parent_index]
+                self._first_child_edge[parent_index] = edge
+        return index
+    
+    def _index_ancestry(self, index, parent, second_parent):
+        generation = 0
+        for parent_index in (parent, second_parent):
+            if parent_index >= 0:
+                generation = max(generation, self.generations[parent_index] + 1)
+        self.generations.append(generation)
+        
+        if parent < 0:
+            self.depths.append(0)
+            self.jumps.append(index)
+            return
+        self.depths.append(self.depths[parent] + 1)
+        jump = self.jumps[parent]
+        if self.depths[parent] - self.depths[jump] == self.depths[jump] - self.depths[self.jumps[jump]]:
+            self.jumps.append(self.jumps[jump])
+        else:
+            self.jumps.append(parent)
+    
+    def first_parent_ancestor(self, index, depth):
+        # The first-parent ancestor of `index` at `depth`, in O(log n) jumps
+        while self.depths[index] > depth:
+            if self.depths[self.jumps[index]] >= depth:
+                index = self.jumps[index]
+            else:
+                index = self.parents[index]
+        return index
+    
+    def first_parent_meet(self, a, b):
+        # Lowest common ancestor of a and b in the first-parent tree, or -1
+        # if their first-parent chains end in different root commits
+        depth = min(self.depths[a], self.depths[b])
+        a = self.first_parent_ancestor(a, depth)
+        b = self.first_parent_ancestor(b, depth)
+        while a != b:
+            if self.depths[a] == 0:
+                return -1
+            if self.jumps[a] != self.jumps[b]:
+                a, b = self.jumps[a], self.jumps[b]
+            else:
+                a, b = self.parents[a], self.parents[b]
+        return a
+    
+    def merge_base(self, a, b):
+        # Best common ancestor of two commits. The first-parent meeting point
+        # is a common ancestor found in O(log n); any better one has a higher
+        # generation, so only commits above that generation are walked, in
+        # decreasing generation order. A commit's paint is final when it is
+        # popped, so the first one reached from both sides is a merge base.
+        meet = self.first_parent_meet(a, b)
+        if meet == a or meet == b:
+            return meet
+        floor = self.generations[meet] if meet >= 0 else 0
+        
+        paint = {a: 1, b: 2}
+        heap = sorted([(-self.generations[a], a), (-self.generations[b], b)])
+        done = set()
+        while heap:
+            _, index = heapq.heappop(heap)
+            if index in done:
+                continue
+            done.add(index)
+            flags = paint[index]
+            if flags == 3:
+                return index
+            for parent_index in (self.parents[index], self.second_parents[index]):
+                if parent_index < 0 or self.generations[parent_index] < floor:
+                    continue
+                old_flags = paint.get(parent_index, 0)
+                if old_flags | flags != old_flags:
+                    paint[parent_index] = old_flags | flags
+                    heapq.heappush(heap, (-self.generations[parent_index], parent_index))
+        return meet
+    
+    def walk(self, start, order='date', since=None):
+        # Lazily yields the indices of `start` and its ancestors, each once.
+        # 'first-parent' follows first parents only; 'topo' pops the highest
+        # generation first, which always puts children before their parents;
+        # 'date' pops the newest timestamp first. Commits older than `since`
+        # (epoch microseconds) are neither yielded nor expanded, since their
+        # ancestors are older still.
+        if order == 'first-parent':
+            index = start
+            while index >= 0 and (since is None or self.timestamps[index] >= since):
+                yield index
+                index = self.parents[index]
+            return
+        if order not in ('topo', 'date'):
+            raise ValueError(f"Unknown log order '{order}'")
+        
+        key = self.generations if order == 'topo' else self.timestamps
+        heap = [(-key[start], -start)]
+        seen = {start}
+        while heap:
+            _, index = heapq.heappop(heap)
+            index = -index
+            if since is not None and self.timestamps[index] < since:
+                continue
+            yield index
+            for parent_index in (self.parents[index], self.second_parents[index]):
+                if parent_index >= 0 and parent_index not in seen:
+                    seen.add(parent_index)
+                    heapq.heappush(heap, (-key[parent_index], -parent_index))
+    
+    def walk_range(self, include, exclude, symmetric=False):
+        # Lazily yields the commits reachable from `include` but not from
+        # `exclude` or, with symmetric, from exactly one of the two. Commits
+        # are popped in decreasing generation order, so each one's paint is
+        # final when it is popped, and the walk stops as soon as everything
+        # still queued is reachable from both sides: shared history below the
+        # two tips is never visited.
+        wanted = (1, 2) if symmetric else (1,)
+        paint = {}
+        for index, flag in ((include, 1), (exclude, 2)):
+            paint[index] = paint.get(index, 0) | flag
+        heap = [(-self.generations[index], -index) for index in paint]
+        heapq.heapify(heap)
+        # Queued commits whose paint would still be yielded
+        live = sum(flags in wanted for flags in paint.values())
+        while live:
+            _, index = heapq.heappop(heap)
+            index = -index
+            flags = paint[index]
+            if flags in wanted:
+                live -= 1
+                yield index
+            for parent_index in (self.parents[index], self.second_parents[index]):
+                if parent_index < 0:
+                    continue
+                old_flags = paint.get(parent_index)
+                if old_flags is None:
+                    # Generations never change, so each commit is queued once
+                    paint[parent_index] = flags
+                    heapq.heappush(heap, (-self.generations[parent_index], -parent_index))
+                    live += flags in wanted
+                elif old_flags | flags != old_flags:
+                    paint[parent_index] = old_flags | flags
+                    live += ((old_flags | flags) in wanted) - (old_flags in wanted)
+    
+    def is_first_parent_ancestor(self, a, b):
+        # Whether a is on b's first-parent chain, in O(log n)
+        return self.depths[a] <= self.depths[b] and self.first_parent_ancestor(b, self.depths[a]) == a
+    
+    def is_ancestor(self, a, b):
+        # Whether a is b or one of its ancestors. Generations rule out most
+        # pairs in O(1) and first-parent ancestry is checked with jump
+        # pointers in O(log n); only otherwise are b's ancestors walked, and
+        # never below a's generation.
+        if a == b:
+            return True
+        if self.generations[a] >= self.generations[b]:
+            return False
+        if self.is_first_parent_ancestor(a, b):
+            return True
+        
+        floor = self.generations[a]
+        stack = [b]
+        seen = {b}
+        while stack:
+            index = stack.pop()
+            for parent_index in (self.parents[index], self.second_parents[index]):
+                if parent_index == a:
+                    return True
+                if parent_index < 0 or parent_index in seen or self.generations[parent_index] <= floor:
+                    continue
+                seen.add(parent_index)
+                stack.append(parent_index)
+        return False
+    
+    def _add_custom_id(self, index, commit_id):
+        self._custom_ids[index] = commit_id
+        self._custom_index[commit_id] = index
+        self._prefix_buckets.setdefault(commit_id[:4], []).append(commit_id)
+    
+    def resolve(self, name):
+        # Index of the commit whose id is `name` or, for stored ids, starts
+        # with it. Prefixes need at least 4 characters and are looked up in
+        # buckets keyed by the first 4, so the cost does not grow with history.
+        if name in self:
+            return self.index_of(name)
+        matches = []
+        if len(name) >= 4:
+            matches = [commit_id for commit_id in self._prefix_buckets.get(name[:4], ()) if commit_id.startswith(name)]
+        if not matches:
+            raise KeyError(name)
+        if len(matches) > 1:
+            raise ValueError(f"Commit prefix '{name}' is ambiguous")
+        return self._custom_index[matches[0]]
+    
+    def id_of(self, index):
+        if index < 0:
+            return None
+        return self._custom_ids.get(index) or f"C{index}"
+    
+    def index_of(self, commit_id):
+        if commit_id is None:
+            return -1
+        index = self._custom_index.get(commit_id)
+        if index is None:
+            index = self._implied_index(commit_id)
+        if index is None:
+            raise KeyError(commit_id)
+        return index
+    
+    def _implied_index(self, commit_id):
+        if not isinstance(commit_id, str) or commit_id[:1] != 'C' or not commit_id[1:].isdigit():
+            return None
+        index = int(commit_id[1:])
+        if index >= len(self.parents) or index in self._custom_ids or commit_id != f"C{index}":
+            return None
+        return index
+    
+    def commit(self, index):
+        return GitCommit(self, index)
+    
+    def parent_columns(self, start=0, stop=None):
+        # Copies of both parent columns for commits start..stop. Records are
+        # never changed once appended, so the copies can be handed to another
+        # thread or process while the store keeps growing. Array slices copy
+        # without exporting the buffer; an export would make a concurrent
+        # append fail.
+        stop = len(self.parents) if stop is None else stop
+        columns = []
+        for column in (self.parents, self.second_parents):
+            part = column[start:stop]
+            if isinstance(part, memoryview):
+                # Still memory-mapped from a binary file, which never grows
+                copy = array('i')
+                copy.frombytes(part.cast('B'))
+                part = copy
+            columns.append(part)
+        return columns
+    
+    def children(self, index, stop=None):
+        # Children among the first `stop` commits (all by default)
+        limit = 2 * (len(self.parents) if stop is None else stop)
+        edge = self._first_child_edge[index]
+        while edge >= 0:
+            if edge < limit:
+                yield edge // 2
+            edge = self._next_edge[edge]
+    
+    def __getitem__(self, commit_id):
+        return GitCommit(self, self.index_of(commit_id))
+    
+    def __contains__(self, commit_id):
+        return commit_id in self._custom_index or self._implied_index(commit_id) is not None
+    
+    def __iter__(self):
+        return (self.id_of(index) for index in range(len(self.parents)))
+    
+    def __reversed__(self):
+        return (self.id_of(index) for index in range(len(self.parents) - 1, -1, -1))
+    
+    def __len__(self):
+        return len(self.parents)
+    
+    # Binary layout: a header, a table of (offset, length) sections and the
+    # sections themselves, 8-byte aligned. Columns are raw little-endian
+    # arrays and strings live in UTF-8 heaps indexed by int64 offsets.
+    BINARY_MAGIC = b'GITSIMB1'
+    BINARY_COLUMNS = ('parents', 'second_parents', 'timestamps', 'message_ids', 'generations',
+                      'depths', 'jumps', '_first_child_edge', '_next_edge')
+    BINARY_SECTIONS = BINARY_COLUMNS + ('message_offsets', 'message_heap', 'custom_indices',
+                                        'custom_id_offsets', 'custom_id_heap', 'refs')
+    _BINARY_HEADER = struct.Struct('<8sIQQQ')
+    
+    def write_binary(self, f, refs, stop=None):
+        # refs is a small bytes blob (branches and HEAD) stored alongside the
+        # commits. Only the first `stop` commits are written, so a snapshot can
+        # be saved while other threads keep appending.
+        stop = len(self) if stop is None else stop
+        message_count = len(self.messages)
+        message_offsets, message_heap = _pack_strings(self.messages[i] for i in range(message_count))
+        custom = sorted(item for item in list(self._custom_ids.items()) if item[0] < stop)
+        custom_id_offsets, custom_id_heap = _pack_strings(commit_id for _, commit_id in custom)
+        sections = self._column_prefixes(stop)
+        sections += [message_offsets, message_heap, array('i', (index for index, _ in custom)),
+                     custom_id_offsets, custom_id_heap, refs]
+        
+        position = self._BINARY_HEADER.size + 16 * len(sections)
+        table = []
+        for section in sections:
+            position += -position % 8
+            table.append((position, memoryview(section).nbytes))
+            position += table[-1][1]
+        
+        f.write(self._BINARY_HEADER.pack(self.BINARY_MAGIC, 1, stop, message_count, len(custom)))
+        f.write(struct.pack(f'<{2 * len(table)}Q', *(value for entry in table for value in entry)))
+        written = self._BINARY_HEADER.size + 16 * len(table)
+        for (offset, length), section in zip(table, sections):
+            f.write(b'\0' * (offset - written))
+            f.write(memoryview(section).cast('B'))
+            written = offset + length
+    
+    def _column_prefixes(self, stop):
+        # The BINARY_COLUMNS cut down to the first `stop` commits
+        sections = [getattr(self, name)[:2 * stop if name == '_next_edge' else stop] for name in self.BINARY_COLUMNS]
+        
+        # Child lists start with the newest child; skip children appended after `stop`
+        first_child = self.BINARY_COLUMNS.index('_first_child_edge')
+        if stop and max(sections[first_child]) >= 2 * stop:
+            edges = array('i', sections[first_child])
+            for index, edge in enumerate(edges):
+                while edge >= 2 * stop:
+                    edge = self._next_edge[edge]
+                edges[index] = edge
+            sections[first_child] = edges
+        return sections
+    
+    def truncated(self, count):
+        # A new store holding the first `count` commits. Snapshots share this
+        # store and rely on commits never changing, so commits are dropped by
+        # copying the rest rather than in place.
+        store = CommitStore()
+        for name, column in zip(self.BINARY_COLUMNS, self._column_prefixes(count)):
+            copy = array(memoryview(column).format)
+            copy.frombytes(memoryview(column).cast('B'))
+            setattr(store, name, copy)
+        store.messages = [self.messages[i] for i in range(len(self.messages))]
+        store._message_index = {message: message_id for message_id, message in enumerate(store.messages)}
+        for index, commit_id in sorted(list(self._custom_ids.items())):
+            if index < count:
+                store._add_custom_id(index, commit_id)
+        return store
     
     @classmethod
-    def from_dict(cls, data):
-        commit = cls(data['id'], data['message'], data['parent'], data.get('second_parent'))
-        commit.timestamp = datetime.datetime.fromisoformat(data['timestamp'])
-        return commit
+    def from_buffer(cls, buffer):
+        # Builds a store whose columns are zero-copy views into `buffer` (an
+        # mmap, typically); messages are decoded when read. Returns the store
+        # and the refs blob. The first append copies everything into arrays.
+        if sys.byteorder != 'little':
+            raise ValueError("Binary repositories can only be opened on little-endian machines")
+        header = cls._BINARY_HEADER.unpack_from(buffer, 0)
+        magic, version, commit_count, message_count, custom_count = header
+        if magic != cls.BINARY_MAGIC or version != 1:
+            raise ValueError("Not a binary repository file")
+        table = struct.unpack_from(f'<{2 * len(cls.BINARY_SECTIONS)}Q', buffer, cls._BINARY_HEADER.size)
+        view = memoryview(buffer)
+        sections = {}
+        for position, name in enumerate(cls.BINARY_SECTIONS):
+            offset, length = table[2 * position], table[2 * position + 1]
+            sections[name] = view[offset:offset + length]
+        
+        store = cls()
+        for name in cls.BINARY_COLUMNS:
+            setattr(store, name, sections[name].cast(getattr(store, name).typecode))
+        store.messages = _StringHeap(sections['message_offsets'].cast('q'), sections['message_heap'])
+        store._message_index = None
+        custom_ids = _StringHeap(sections['custom_id_offsets'].cast('q'), sections['custom_id_heap'])
+        for index, commit_id in zip(sections['custom_indices'].cast('i'), custom_ids):
+            store._add_custom_id(index, commit_id)
+        return store, bytes(sections['refs'])
+    
+    def _materialize(self):
+        # Copy memory-mapped columns into arrays so the store can grow
+        for name in self.BINARY_COLUMNS:
+            column = getattr(self, name)
+            if isinstance(column, memoryview):
+                copy = array(column.format)
+                copy.frombytes(column.cast('B'))
+                setattr(self, name, copy)
+        self.messages = list(self.messages)
+        self._message_index = {message: message_id for message_id, message in enumerate(self.messages)}
 
 class GitBranch:
     def __init__(self, name, head, color=None):
@@ -54,27 +548,696 @@ class GitBranch:
     def from_dict(cls, data):
         return cls(data['name'], data['head'], data['color'])
 
-class GitRepository:
+class Reflog:
+    # Where one ref has pointed, newest last: a ring of (commit index, op
+    # code, timestamp) entries in three arrays that stop growing at capacity,
+    # after which each entry overwrites the oldest. entry(0) is the newest.
+    OPS = ('init', 'load', 'commit', 'branch', 'checkout', 'merge', 'import', 'undo', 'redo')
+    
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.indices = array('i')
+        self.ops = array('B')
+        self.timestamps = array('q')
+        self.total = 0
+    
+    def __len__(self):
+        return len(self.indices)
+    
+    def append(self, index, op, timestamp):
+        code = self.OPS.index(op)
+        if len(self.indices) < self.capacity:
+            self.indices.append(index)
+            self.ops.append(code)
+            self.timestamps.append(timestamp)
+        else:
+            slot = self.total % self.capacity
+            self.indices[slot] = index
+            self.ops[slot] = code
+            self.timestamps[slot] = timestamp
+        self.total += 1
+    
+    def entry(self, n):
+        # (commit index, op, timestamp) of the nth newest entry; the index is
+        # -1 once the commit has been replaced after an undo
+        if not 0 <= n < len(self.indices):
+            raise IndexError(n)
+        slot = (self.total - 1 - n) % self.capacity
+        return self.indices[slot], self.OPS[self.ops[slot]], self.timestamps[slot]
+    
+    def forget(self, count):
+        # Commits from `count` on are about to be dropped from the store. The
+        # indices are replaced rather than edited so frozen views keep theirs.
+        self.indices = array('i', (-1 if index >= count else index for index in self.indices))
+    
+    def frozen(self):
+        return FrozenReflog(self)
+
+class FrozenReflog:
+    # A reflog as of one moment, for snapshots. It shares the live ring's
+    # arrays, so entries the ring has overwritten since are out of its reach.
+    def __init__(self, reflog):
+        self.reflog = reflog
+        self.indices = reflog.indices
+        self.total = reflog.total
+        self.length = len(reflog.indices)
+    
+    def __len__(self):
+        return self.length
+    
+    def entry(self, n):
+        reflog = self.reflog
+        position = self.total - 1 - n
+        if not 0 <= n < self.length or position < reflog.total - reflog.capacity:
+            raise IndexError(n)
+        slot = position % reflog.capacity
+        return self.indices[slot], Reflog.OPS[reflog.ops[slot]], reflog.timestamps[slot]
+
+class ChangeFeed:
+    # Append-only log of repository changes. Each consumer keeps the cursor it
+    # has read up to and asks for everything published after it. Events are
+    # (kind, value) pairs: a commit index for 'commit', a commit count for
+    # 'count' (undo/redo changed how many commits are current) and 'truncate'
+    # (undone commits were dropped), a branch name for the others. They are
+    # packed into arrays, with names interned in a table.
+    KINDS = ('commit', 'branch', 'move', 'checkout', 'delete', 'count', 'truncate')
+    NUMERIC_KINDS = ('commit', 'count', 'truncate')
+    
     def __init__(self):
-        self.commits = {}
+        self.kinds = array('b')
+        self.values = array('i')
+        self.names = []
+        self._name_index = {}
+    
+    def publish(self, kind, value):
+        if kind not in self.NUMERIC_KINDS:
+            name = value
+            value = self._name_index.get(name)
+            if value is None:
+                value = self._name_index[name] = len(self.names)
+                self.names.append(name)
+        self.kinds.append(self.KINDS.index(kind))
+        self.values.append(value)
+    
+    def publish_commits(self, start, stop):
+        # Bulk form of publish('commit', i) for i in range(start, stop); the
+        # zero bytes are the kind code of 'commit'
+        self.kinds.frombytes(bytes(stop - start))
+        self.values.extend(range(start, stop))
+    
+    def since(self, cursor, stop=None):
+        # Events from `cursor` up to `stop` (the end by default) and the cursor after them
+        stop = len(self.kinds) if stop is None else stop
+        events = []
+        for kind, value in zip(self.kinds[cursor:stop], self.values[cursor:stop]):
+            kind = self.KINDS[kind]
+            events.append((kind, value if kind in self.NUMERIC_KINDS else self.names[value]))
+        return events, stop
+
+_JSON_WHITESPACE = re.compile(r'[ \t\r\n]*')
+_JSON_MEMBER_KEY = re.compile(r'[ \t\r\n]*("(?:[^"\\]|\\.)*")[ \t\r\n]*:[ \t\r\n]*')
+
+class JsonStreamReader:
+    # Incremental reader for large JSON documents. Objects are walked member
+    # by member and each value is decoded on its own, so memory use is
+    # bounded by the read buffer and the largest single value rather than by
+    # the size of the file. progress(bytes_read, total_bytes) is called after
+    # every chunk.
+    def __init__(self, f, total=None, progress=None, chunk_size=1 << 16):
+        self.f = f
+        self.total = total
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+    
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self._decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        if self.progress:
+            self.progress(self.bytes_read, self.total)
+        return True
+    
+    def _peek(self):
+        while True:
+            self.pos = _JSON_WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON data")
+    
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.bytes_read - len(self.buffer) + self.pos}")
+        self.pos += 1
+    
+    def read_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number or literal touching the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+    
+    def members(self):
+        # Yields the keys of the object at the current position; the caller
+        # must consume each value (read_value or members) before the next key
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self._expect(':')
+            yield key
+            if self._peek() == ',':
+                self.pos += 1
+                continue
+            self._expect('}')
+            return
+    
+    def items(self):
+        # Same as members() followed by read_value() for each key, with the
+        # key and separators matched in one step for large flat objects
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            match = _JSON_MEMBER_KEY.match(self.buffer, self.pos)
+            if (match is None or match.end() == len(self.buffer)) and self._fill():
+                continue
+            if match is None:
+                raise ValueError(f"Expected an object key at offset {self.bytes_read - len(self.buffer) + self.pos}")
+            self.pos = match.end()
+            yield json.decoder.scanstring(match.group(1), 1)[0], self.read_value()
+            if self._peek() == ',':
+                self.pos += 1
+                continue
+            self._expect('}')
+            return
+
+def iter_repository_file(filename, progress=None):
+    # Streams a repository saved by GitRepository.save_to_file as a sequence
+    # of ('commit', data), ('branch', data), ('current_branch', name) and
+    # ('content_ids', flag) records, in file order
+    with open(filename, 'rb') as f:
+        reader = JsonStreamReader(f, os.path.getsize(filename), progress)
+        for key in reader.members():
+            if key == 'commits':
+                for _, commit_data in reader.items():
+                    yield 'commit', commit_data
+            elif key == 'branches':
+                for _, branch_data in reader.items():
+                    yield 'branch', branch_data
+            elif key in ('current_branch', 'content_ids'):
+                yield key, reader.read_value()
+            else:
+                reader.read_value()
+
+def content_commit_id(message, parent, second_parent, timestamp):
+    content = f"{parent or ''}\n{second_parent or ''}\n{timestamp}\n{message}"
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+# Repositories saved under this suffix use the memory-mapped binary format
+BINARY_SUFFIX = '.bin'
+
+# Checking out anything but a branch detaches HEAD: the commit is held by a
+# branch of this name, which is dropped again when a real branch is checked out
+DETACHED_HEAD = 'HEAD'
+
+_REFLOG_REF = re.compile(r'(.*)@\{(\d+)\}')
+_REVISION_STEPS = re.compile(r'(?:[~^]\d*)*')
+_REVISION_STEP = re.compile(r'([~^])(\d*)')
+
+def valid_branch_name(name):
+    # Names that could be read as a revision expression are refused
+    return (bool(name) and name not in (DETACHED_HEAD, '@')
+            and not any(mark in name for mark in ('~', '^', '..', '@{')))
+
+def parse_range(text):
+    # (exclude, include, symmetric) for 'A..B' or 'A...B', an empty side
+    # meaning HEAD; None if text is not a range
+    for separator, symmetric in (('...', True), ('..', False)):
+        left, found, right = text.partition(separator)
+        if found:
+            return left or DETACHED_HEAD, right or DETACHED_HEAD, symmetric
+    return None
+
+def resolve_revision(view, text):
+    # Index of the commit `text` names in `view` (a repository or snapshot):
+    # a branch, HEAD (or @), ref@{n}, a commit id or unique id prefix,
+    # followed by any number of ~n (the nth first-parent ancestor, reached
+    # through the jump pointers) and ^n (the nth parent; ^0 is the commit
+    # itself). Raises ValueError saying what did not resolve.
+    if '..' in text:
+        raise ValueError(f"'{text}' is a range, not a single commit")
+    cut = min([text.index(mark) for mark in '~^' if mark in text] or [len(text)])
+    base, steps = text[:cut], text[cut:]
+    if not _REVISION_STEPS.fullmatch(steps):
+        raise ValueError(f"Unknown revision '{text}'")
+    
+    commits = view.commits
+    index = _resolve_base(view, base)
+    for op, count in _REVISION_STEP.findall(steps):
+        count = int(count) if count else 1
+        if op == '~':
+            depth = commits.depths[index]
+            if count > depth:
+                raise ValueError(f"'{text}' goes back past the first commit")
+            index = commits.first_parent_ancestor(index, depth - count)
+        elif count:
+            parent = (commits.parents, commits.second_parents)[count - 1][index] if count <= 2 else -1
+            if parent < 0:
+                raise ValueError(f"'{text}': {commits.id_of(index)} has no parent {count}")
+            index = parent
+    return index
+
+def _resolve_base(view, name):
+    commits = view.commits
+    if name in view.branches:
+        return commits.index_of(view.branches[name].head)
+    if name in (DETACHED_HEAD, '@'):
+        return commits.index_of(view.branches[view.current_branch].head)
+    
+    match = _REFLOG_REF.fullmatch(name)
+    if match:
+        # Read straight from the ring (HEAD's when ref is empty)
+        reflog = view.reflogs.get(match.group(1) or DETACHED_HEAD)
+        if reflog is None:
+            raise ValueError(f"No reflog for '{match.group(1)}'")
+        try:
+            index = reflog.entry(int(match.group(2)))[0]
+        except IndexError:
+            raise ValueError(f"'{name}' goes back further than the reflog ({len(reflog)} entries)")
+        if not 0 <= index < view.commit_count:
+            raise ValueError(f"The commit '{name}' referred to is gone")
+        return index
+    
+    try:
+        index = commits.resolve(name)
+    except KeyError:
+        raise ValueError(f"Unknown revision '{name}'")
+    if index >= view.commit_count:
+        raise ValueError(f"Unknown revision '{name}'")
+    return index
+
+class RepositoryView:
+    # Lookups shared by repositories and their snapshots, which both have
+    # commits, commit_count, branches, current_branch, content_ids and reflogs
+    def short_id(self, commit_id):
+        return commit_id[:7] if self.content_ids else commit_id
+    
+    def resolve_commit(self, name):
+        # Revision expression (see resolve_revision) to a commit id, or None
+        try:
+            return self.commits.id_of(resolve_revision(self, name))
+        except ValueError:
+            return None
+    
+    def commit_ids(self):
+        # The ids of the visible history; with content-addressed ids two
+        # repositories compare with plain set operations on these
+        return {self.commits.id_of(index) for index in range(self.commit_count)}
+
+class RepositorySnapshot(RepositoryView):
+    # A repository as of one moment, for readers (log, layout, save) running
+    # alongside the thread that executes commands. Commits are never changed
+    # once appended, so the store itself is shared and only the first
+    # commit_count commits belong to the snapshot; the branch table is a copy,
+    # and branch moves replace GitBranch objects rather than updating them.
+    def __init__(self, repo):
+        self.commits = repo.commits
+        self.commit_count = repo.commit_count
+        self.branches = dict(repo.branches)
+        self.current_branch = repo.current_branch
+        self.content_ids = repo.content_ids
+        self.change_count = len(repo.changes.kinds)
+        self.reflogs = {name: reflog.frozen() for name, reflog in repo.reflogs.items()}
+    
+    def iter_commits(self, start=None, order='date', limit=None, since=None, until=None):
+        # Returns a lazy iterator of GitCommit views from `start` (a revision;
+        # the current branch by default) back through its history in
+        # 'first-parent', 'topo' or 'date' order. since and until are
+        # datetimes bounding the commit timestamps. `start` may also be a
+        # range, 'A..B' or 'A...B', which comes in topological order, or with
+        # 'first-parent' keeps to the tips' first-parent chains. Raises
+        # ValueError if a revision does not resolve.
+        since_us = _to_epoch_us(since) if since else None
+        until_us = _to_epoch_us(until) if until else None
+        revision_range = parse_range(start) if start else None
+        if revision_range is None:
+            indices = self.commits.walk(resolve_revision(self, start or self.current_branch), order, since_us)
+        else:
+            exclude, include, symmetric = revision_range
+            include, exclude = resolve_revision(self, include), resolve_revision(self, exclude)
+            indices = self.commits.walk_range(include, exclude, symmetric)
+            if order == 'first-parent':
+                tips = (include, exclude) if symmetric else (include,)
+                indices = (index for index in indices
+                           if any(self.commits.is_first_parent_ancestor(index, tip) for tip in tips))
+        return self._select_commits(indices, limit, since_us, until_us)
+    
+    def _select_commits(self, indices, limit, since_us, until_us):
+        count = 0
+        for index in indices:
+            if limit is not None and count >= limit:
+                return
+            timestamp = self.commits.timestamps[index]
+            if (until_us is not None and timestamp > until_us) or (since_us is not None and timestamp < since_us):
+                continue
+            count += 1
+            yield self.commits.commit(index)
+    
+    def get_commit_log(self, order='first-parent', limit=None):
+        branch = self.branches.get(self.current_branch)
+        if not branch:
+            return "Error: Current branch not found"
+        
+        result = [GitRepository.format_log_entry(commit) for commit in self.iter_commits(order=order, limit=limit)]
+        return "\n".join(result) if result else "No commits yet"
+    
+    def save_to_file(self, filename, progress=None):
+        if filename.endswith(BINARY_SUFFIX):
+            self._save_binary(filename, progress)
+        else:
+            self._save_json(filename, progress)
+        
+        # A fresh snapshot supersedes any autosave journal kept beside it
+        if os.path.exists(filename + JOURNAL_SUFFIX):
+            os.remove(filename + JOURNAL_SUFFIX)
+    
+    def _save_json(self, filename, progress=None):
+        # Written one commit at a time in the same layout json.dump produced,
+        # so memory does not grow with the history; progress(done, total) is
+        # called every few thousand commits
+        total = self.commit_count
+        with open(filename, 'w') as f:
+            f.write('{\n  "commits": {')
+            for index in range(total):
+                commit = self.commits.commit(index)
+                f.write(',\n    ' if index else '\n    ')
+                f.write(f"{json.dumps(commit.id)}: {json.dumps(commit.to_dict())}")
+                if progress and (index + 1) % 10000 == 0:
+                    progress(index + 1, total)
+            f.write('\n  },\n  "branches": {')
+            for position, branch in enumerate(self.branches.values()):
+                f.write(',\n    ' if position else '\n    ')
+                f.write(f"{json.dumps(branch.name)}: {json.dumps(branch.to_dict())}")
+            f.write(f'\n  }},\n  "current_branch": {json.dumps(self.current_branch)}')
+            if self.content_ids:
+                f.write(',\n  "content_ids": true')
+            f.write('\n}\n')
+        if progress:
+            progress(total, total)
+    
+    def _save_binary(self, filename, progress=None):
+        refs = json.dumps({
+            'branches': [branch.to_dict() for branch in self.branches.values()],
+            'current_branch': self.current_branch,
+            'content_ids': self.content_ids,
+        }).encode('utf-8')
+        
+        # The old file may still be memory-mapped by this repository, so the
+        # new one is written beside it and moved into place
+        temporary = filename + '.tmp'
+        with open(temporary, 'wb') as f:
+            self.commits.write_binary(f, refs, self.commit_count)
+        os.replace(temporary, filename)
+        if progress:
+            progress(self.commit_count, self.commit_count)
+
+def _writer(label):
+    # GitRepository methods that change the repository run under its writer
+    # lock, retire the cached snapshot when they are done and leave an undo
+    # step (named `label`) describing what they changed; the label is also
+    # the reflog op for the refs they move
+    def decorate(method):
+        @functools.wraps(method)
+        def locked(self, *args, **kwargs):
+            with self._lock:
+                outermost = self._recording is None
+                if outermost:
+                    self._recording = ([], self.current_branch, self.commit_count)
+                    self._operation = label
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    self._snapshot = None
+                    if outermost:
+                        self._log_head()
+                        self._operation = 'load'
+                        self._record_undo(label)
+        return locked
+    return decorate
+
+class GitRepository(RepositoryView):
+    UNDO_LIMIT = 10000
+    REFLOG_SIZE = 256
+    
+    def __init__(self, content_ids=False):
+        # With content_ids, commit ids are SHA-1 hashes of the parents,
+        # timestamp and message instead of sequential C<n> ids, so equal
+        # commits get equal ids in every repository
+        self.content_ids = content_ids
+        self.commits = CommitStore()
         self.branches = {}
         self.current_branch = None
+        self.changes = ChangeFeed()
+        self._graph = None
+        self._graph_nodes = []
+        self._graph_cursor = 0
+        
+        # Commands change the repository under the writer lock; readers on
+        # other threads use snapshot() instead and never take it for long
+        self._lock = threading.RLock()
+        self._snapshot = None
+        
+        # Undo steps record only what a command changed (the GitBranch objects
+        # it replaced, the current branch and the commit count), so stepping
+        # either way is O(1). Undone commits stay in the store, beyond
+        # _visible, until a new commit takes their place.
+        self._undo = deque(maxlen=self.UNDO_LIMIT)
+        self._redo = []
+        self._recording = None
+        self._visible = None
+        
+        # A reflog per branch, and one for HEAD. Ref changes made outside
+        # commands come from setting up the repository or loading a file.
+        self.reflogs = {}
+        self._logged_head = None
+        self._operation = 'init'
         
         # Initialize with a first commit and master branch
         self._initialize_repo()
+        self._log_head()
+        self._operation = 'load'
     
     def _initialize_repo(self):
         # Create initial commit
-        initial_commit = GitCommit('C0', 'Initial commit')
-        self.commits[initial_commit.id] = initial_commit
+        initial_commit_id = self._create_commit_record('Initial commit')
         
         # Create master branch pointing to initial commit
-        master_branch = GitBranch('master', initial_commit.id)
-        self.branches[master_branch.name] = master_branch
+        master_branch = GitBranch('master', initial_commit_id)
+        self._add_branch(master_branch)
         
         # Set current branch to master
         self.current_branch = 'master'
     
+    @property
+    def commit_count(self):
+        # Commits in the current state; after an undo the store also holds the undone ones
+        return len(self.commits) if self._visible is None else self._visible
+    
+    def _set_commit_count(self, count):
+        self._visible = None if count == len(self.commits) else count
+        self.changes.publish('count', count)
+    
+    def _discard_undone(self):
+        # A new commit after an undo replaces the undone commits for good
+        if self._visible is not None:
+            for reflog in self.reflogs.values():
+                reflog.forget(self._visible)
+            self.commits = self.commits.truncated(self._visible)
+            self._visible = None
+            self.changes.publish('truncate', len(self.commits))
+    
+    def _add_commit(self, commit_id, message, parent=None, second_parent=None, timestamp=None):
+        self._discard_undone()
+        index = self.commits.append(commit_id, message, parent, second_parent, timestamp)
+        self.changes.publish('commit', index)
+        return commit_id
+    
+    def _create_commit_record(self, message, parent=None, second_parent=None):
+        self._discard_undone()
+        timestamp = time.time_ns() // 1000
+        if not self.content_ids:
+            return self._add_commit(f"C{len(self.commits)}", message, parent, second_parent, timestamp)
+        
+        # Identical content hashes to the id already stored, so it is reused
+        commit_id = content_commit_id(message, parent, second_parent, timestamp)
+        if commit_id in self.commits:
+            return commit_id
+        return self._add_commit(commit_id, message, parent, second_parent, timestamp)
+    
+    def snapshot(self):
+        # The cached snapshot is reused until the next change; taking a new
+        # one waits for a command in progress and copies the branch table
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot = RepositorySnapshot(self)
+        return snapshot
+    
+    @_writer('import')
+    def import_commits(self, other):
+        # Copies the commits of another content-addressed repository that are
+        # not already here; returns how many were added
+        if not (self.content_ids and other.content_ids):
+            raise ValueError("Both repositories must use content-addressed ids")
+        self._discard_undone()
+        added = 0
+        # Commits the other repository has undone are still stored there but
+        # are not part of its history
+        for index in range(other.commit_count):
+            commit_id = other.commits.id_of(index)
+            if commit_id in self.commits:
+                continue
+            commit = other.commits.commit(index)
+            self._add_commit(commit_id, commit.message, commit.parent, commit.second_parent,
+                             other.commits.timestamps[index])
+            added += 1
+        return added
+    
+    def children(self, commit_id):
+        index = self.commits.index_of(commit_id)
+        return [self.commits.id_of(child) for child in self.commits.children(index, self.commit_count)]
+    
+    def _add_branch(self, branch):
+        self._note_branch(branch.name, branch)
+        self.branches[branch.name] = branch
+        self._log_ref(branch.name, branch.head)
+        self.changes.publish('branch', branch.name)
+    
+    def _move_branch(self, branch, commit_id):
+        # Replaced rather than updated, so snapshots and undo steps keep the
+        # old head. Staying put is not a move and leaves nothing to undo.
+        if commit_id == branch.head:
+            return
+        moved = GitBranch(branch.name, commit_id, branch.color)
+        self._note_branch(branch.name, moved)
+        self.branches[branch.name] = moved
+        self._log_ref(branch.name, commit_id)
+        self.changes.publish('move', branch.name)
+    
+    def _remove_branch(self, name):
+        self._note_branch(name, None)
+        del self.branches[name]
+        self._drop_reflog(name)
+        self.changes.publish('delete', name)
+    
+    def _log_ref(self, name, commit_id):
+        # A detached HEAD is only recorded in HEAD's own reflog
+        if name == DETACHED_HEAD:
+            return
+        reflog = self.reflogs.get(name)
+        if reflog is None:
+            reflog = self.reflogs[name] = Reflog(self.REFLOG_SIZE)
+        reflog.append(self.commits.index_of(commit_id), self._operation, time.time_ns() // 1000)
+    
+    def _drop_reflog(self, name):
+        if name != DETACHED_HEAD:
+            self.reflogs.pop(name, None)
+    
+    def _log_head(self):
+        # HEAD's reflog gets an entry whenever the checked out branch or its head changes
+        head = self.branches[self.current_branch].head
+        if (self.current_branch, head) != self._logged_head:
+            self._logged_head = (self.current_branch, head)
+            reflog = self.reflogs.get(DETACHED_HEAD)
+            if reflog is None:
+                reflog = self.reflogs[DETACHED_HEAD] = Reflog(self.REFLOG_SIZE)
+            reflog.append(self.commits.index_of(head), self._operation, time.time_ns() // 1000)
+    
+    def _note_branch(self, name, branch):
+        if self._recording is not None:
+            self._recording[0].append((name, self.branches.get(name), branch))
+    
+    def _record_undo(self, label):
+        changes, old_branch, old_count = self._recording
+        self._recording = None
+        if changes or old_branch != self.current_branch or old_count != self.commit_count:
+            self._undo.append((label, tuple(changes), old_branch, self.current_branch, old_count, self.commit_count))
+            self._redo.clear()
+    
+    def undo(self):
+        with self._lock:
+            if not self._undo:
+                return False, "Nothing to undo"
+            step = self._undo.pop()
+            self._apply_step(step, backwards=True)
+            self._redo.append(step)
+            self._snapshot = None
+        return True, f"Undid {step[0]}; {self._describe_head()}"
+    
+    def redo(self):
+        with self._lock:
+            if not self._redo:
+                return False, "Nothing to redo"
+            step = self._redo.pop()
+            self._apply_step(step, backwards=False)
+            self._undo.append(step)
+            self._snapshot = None
+        return True, f"Redid {step[0]}; {self._describe_head()}"
+    
+    def _apply_step(self, step, backwards):
+        _, changes, old_branch, new_branch, old_count, new_count = step
+        self._operation = 'undo' if backwards else 'redo'
+        for name, before, after in (reversed(changes) if backwards else changes):
+            branch = before if backwards else after
+            if branch is None:
+                del self.branches[name]
+                self._drop_reflog(name)
+                self.changes.publish('delete', name)
+            else:
+                kind = 'move' if name in self.branches else 'branch'
+                self.branches[name] = branch
+                self._log_ref(name, branch.head)
+                self.changes.publish(kind, name)
+        
+        current_branch = old_branch if backwards else new_branch
+        if current_branch != self.current_branch:
+            self.current_branch = current_branch
+            self.changes.publish('checkout', current_branch)
+        count = old_count if backwards else new_count
+        if count != self.commit_count:
+            self._set_commit_count(count)
+        self._log_head()
+        self._operation = 'load'
+    
+    def _describe_head(self):
+        head = self.branches[self.current_branch].head
+        if self.current_branch == DETACHED_HEAD:
+            return f"HEAD is at {self.short_id(head)}"
+        return f"'{self.current_branch}' is at {self.short_id(head)}"
+    
+    @_writer('commit')
     def create_commit(self, message):
         # Get current branch
         branch = self.branches.get(self.current_branch)
@@ -85,147 +1248,1432 @@ class GitRepository:
         parent_id = branch.head
         
         # Create new commit
-        commit_id = f"C{len(self.commits)}"
-        new_commit = GitCommit(commit_id, message, parent_id)
-        self.commits[commit_id] = new_commit
+        commit_id = self._create_commit_record(message, parent_id)
         
         # Update branch head
-        branch.head = commit_id
+        self._move_branch(branch, commit_id)
         
-        return True, f"Created commit {commit_id}: {message}"
+        return True, f"Created commit {self.short_id(commit_id)}: {message}"
     
+    @_writer('branch')
     def create_branch(self, name):
         if name in self.branches:
             return False, f"Error: Branch '{name}' already exists"
+        if not valid_branch_name(name):
+            return False, f"Error: '{name}' is not a valid branch name"
         
         current_head = self.branches[self.current_branch].head
         new_branch = GitBranch(name, current_head)
-        self.branches[name] = new_branch
+        self._add_branch(new_branch)
         
-        return True, f"Created branch '{name}' at commit {current_head}"
+        return True, f"Created branch '{name}' at commit {self.short_id(current_head)}"
     
+    @_writer('checkout')
     def checkout_branch(self, name):
+        # A branch is checked out as such; any other revision (ref@{n},
+        # HEAD~2, an id) detaches HEAD at its commit
+        if name in (DETACHED_HEAD, '@'):
+            return True, f"Already on '{self.current_branch}'"
         if name not in self.branches:
-            return False, f"Error: Branch '{name}' not found"
+            try:
+                commit_id = self.commits.id_of(resolve_revision(self, name))
+            except ValueError as error:
+                return False, f"Error: {error}"
+            if DETACHED_HEAD in self.branches:
+                self._move_branch(self.branches[DETACHED_HEAD], commit_id)
+            else:
+                self._add_branch(GitBranch(DETACHED_HEAD, commit_id))
+            if self.current_branch != DETACHED_HEAD:
+                self.current_branch = DETACHED_HEAD
+                self.changes.publish('checkout', DETACHED_HEAD)
+            return True, f"HEAD is now at {self.short_id(commit_id)}"
         
+        detached = self.current_branch == DETACHED_HEAD
         self.current_branch = name
+        self.changes.publish('checkout', name)
+        if detached and name != DETACHED_HEAD:
+            self._remove_branch(DETACHED_HEAD)
         
         return True, f"Switched to branch '{name}'"
     
-    def merge_branches(self, source_branch_name):
-        # Get target and source branches
-        target_branch = self.branches.get(self.current_branch)
-        source_branch = self.branches.get(source_branch_name)
+    def merge_base(self, a, b):
+        # Accepts branch names or commit ids; returns a commit id, or None when
+        # either side is unknown or the two histories share no commit
+        indices = []
+        for name in (a, b):
+            commit_id = self.resolve_commit(name)
+            if commit_id is None:
+                return None
+            indices.append(self.commits.index_of(commit_id))
+        return self.commits.id_of(self.commits.merge_base(*indices))
+    
+    def is_ancestor(self, ancestor_id, commit_id):
+        return self.commits.is_ancestor(self.commits.index_of(ancestor_id), self.commits.index_of(commit_id))
+    
+    @_writer('merge')
+    def merge_branches(self, source_branch_name, mode='ff'):
+        # mode is 'ff' (fast-forward when possible), 'no-ff' (always create a
+        # merge commit) or 'ff-only' (refuse anything but a fast-forward)
+        if mode not in ('ff', 'no-ff', 'ff-only'):
+            return False, f"Error: Unknown merge mode '{mode}'"
         
-        if not source_branch:
-            return False, f"Error: Branch '{source_branch_name}' not found"
+        # Get target branch and the source commit, which any revision can name
+        target_branch = self.branches.get(self.current_branch)
+        try:
+            source_head = self.commits.id_of(resolve_revision(self, source_branch_name))
+        except ValueError as error:
+            return False, f"Error: {error}"
         
         # Check if merge is needed
-        if target_branch.head == source_branch.head:
+        if self.is_ancestor(source_head, target_branch.head):
             return True, "Already up to date. Nothing to merge."
         
+        # Move the target forward when it has no commits of its own
+        if mode != 'no-ff' and self.is_ancestor(target_branch.head, source_head):
+            old_head = target_branch.head
+            self._move_branch(target_branch, source_head)
+            return True, (f"Fast-forward '{self.current_branch}' from {self.short_id(old_head)} "
+                          f"to {self.short_id(source_head)}")
+        if mode == 'ff-only':
+            return False, f"Error: Cannot fast-forward '{self.current_branch}' to '{source_branch_name}', aborting"
+        
         # Create merge commit
-        commit_id = f"C{len(self.commits)}"
-        message = f"Merge branch '{source_branch_name}' into {self.current_branch}"
-        merge_commit = GitCommit(commit_id, message, target_branch.head, source_branch.head)
-        self.commits[commit_id] = merge_commit
+        kind = 'branch' if source_branch_name in self.branches else 'commit'
+        message = f"Merge {kind} '{source_branch_name}' into {self.current_branch}"
+        commit_id = self._create_commit_record(message, target_branch.head, source_head)
         
         # Update branch head
-        target_branch.head = commit_id
+        self._move_branch(target_branch, commit_id)
         
         return True, f"Merged '{source_branch_name}' into '{self.current_branch}'"
     
-    def get_commit_log(self):
-        branch = self.branches.get(self.current_branch)
-        if not branch:
-            return "Error: Current branch not found"
-        
-        result = []
-        current_commit_id = branch.head
-        
-        while current_commit_id:
-            commit = self.commits.get(current_commit_id)
-            if not commit:
-                break
-            
-            result.append(f"Commit: {commit.id}")
-            result.append(f"Message: {commit.message}")
-            result.append(f"Date: {commit.timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-            result.append("")
-            
-            current_commit_id = commit.parent
-        
-        return "\n".join(result) if result else "No commits yet"
+    def iter_commits(self, start=None, order='date', limit=None, since=None, until=None):
+        return self.snapshot().iter_commits(start, order, limit, since, until)
     
-    def save_to_file(self, filename):
-        data = {
-            'commits': {commit_id: commit.to_dict() for commit_id, commit in self.commits.items()},
-            'branches': {branch_name: branch.to_dict() for branch_name, branch in self.branches.items()},
-            'current_branch': self.current_branch,
-        }
-        
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+    @staticmethod
+    def format_log_entry(commit):
+        return (f"Commit: {commit.id}\n"
+                f"Message: {commit.message}\n"
+                f"Date: {commit.timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n")
+    
+    def get_commit_log(self, order='first-parent', limit=None):
+        return self.snapshot().get_commit_log(order, limit)
+    
+    def get_reflog(self, name=None, limit=None):
+        # Entries newest first, as "<id> <name>@{n}: <op>[: <message>]"
+        name = name or DETACHED_HEAD
+        reflog = self.reflogs.get(name)
+        if reflog is None:
+            return f"Error: No reflog for '{name}'"
+        lines = []
+        for n in range(len(reflog) if limit is None else min(limit, len(reflog))):
+            index, op, _ = reflog.entry(n)
+            if not 0 <= index < self.commit_count:
+                lines.append(f"{'(gone)':7} {name}@{{{n}}}: {op}")
+            elif op == 'commit':
+                commit = self.commits.commit(index)
+                lines.append(f"{self.short_id(commit.id)} {name}@{{{n}}}: commit: {commit.message}")
+            else:
+                lines.append(f"{self.short_id(self.commits.id_of(index))} {name}@{{{n}}}: {op}")
+        return "\n".join(lines)
+    
+    def save_to_file(self, filename, progress=None):
+        self.snapshot().save_to_file(filename, progress)
     
     @classmethod
-    def load_from_file(cls, filename):
-        with open(filename, 'r') as f:
-            data = json.load(f)
+    def _load_binary(cls, filename):
+        with open(filename, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        commits, refs = CommitStore.from_buffer(buffer)
+        refs = json.loads(refs)
         
         repo = cls()
-        repo.commits = {}
+        repo.commits = commits
         repo.branches = {}
+        repo.reflogs = {}
+        repo._logged_head = None
+        repo.changes = ChangeFeed()
+        repo.changes.publish_commits(0, len(commits))
+        for branch_data in refs['branches']:
+            repo._add_branch(GitBranch.from_dict(branch_data))
+        repo.current_branch = refs['current_branch']
+        repo.content_ids = refs.get('content_ids', False)
+        repo._replay_journal(filename)
+        repo._log_head()
+        return repo
+    
+    @classmethod
+    def load_from_file(cls, filename, progress=None):
+        with open(filename, 'rb') as f:
+            is_binary = f.read(len(CommitStore.BINARY_MAGIC)) == CommitStore.BINARY_MAGIC
+        if is_binary:
+            return cls._load_binary(filename)
         
-        for commit_id, commit_data in data['commits'].items():
-            repo.commits[commit_id] = GitCommit.from_dict(commit_data)
+        repo = cls()
+        repo.commits = CommitStore()
+        repo.branches = {}
+        repo.reflogs = {}
+        repo._logged_head = None
+        repo.changes = ChangeFeed()
         
-        for branch_name, branch_data in data['branches'].items():
-            repo.branches[branch_name] = GitBranch.from_dict(branch_data)
+        # Commits are normally saved parents first; any that arrive before a
+        # parent wait until it has been added. Branches are added last, once
+        # the commits their heads name (and their reflogs index) are all in.
+        waiting = {}
+        branches = []
+        for kind, data in iter_repository_file(filename, progress):
+            if kind == 'commit':
+                ready = [data]
+                while ready:
+                    commit_data = ready.pop()
+                    timestamp = _to_epoch_us(datetime.datetime.fromisoformat(commit_data['timestamp']))
+                    try:
+                        repo._add_commit(commit_data['id'], commit_data['message'], commit_data['parent'],
+                                         commit_data.get('second_parent'), timestamp)
+                    except KeyError as missing:
+                        waiting.setdefault(missing.args[0], []).append(commit_data)
+                        continue
+                    ready.extend(waiting.pop(commit_data['id'], []))
+            elif kind == 'branch':
+                branches.append(GitBranch.from_dict(data))
+            elif kind == 'content_ids':
+                repo.content_ids = data
+            else:
+                repo.current_branch = data
         
-        repo.current_branch = data['current_branch']
-        repo.head = data['head']
+        if waiting:
+            raise ValueError(f"Commits refer to missing parent {next(iter(waiting))}")
+        for branch in branches:
+            if branch.head not in repo.commits:
+                raise ValueError(f"Branch '{branch.name}' refers to missing commit {branch.head}")
+            repo._add_branch(branch)
         
+        repo._replay_journal(filename)
+        repo._log_head()
         return repo
     
+    def _replay_journal(self, filename):
+        if os.path.exists(filename + JOURNAL_SUFFIX):
+            RepositoryJournal.replay(self, filename + JOURNAL_SUFFIX)
+    
     def build_graph(self):
-        # Create a directed graph
-        G = nx.DiGraph()
+        import networkx as nx
+        
+        # The graph is kept alive between calls and holds the first
+        # len(_graph_nodes) commits; each call only adds or removes the ones
+        # that changed since, so callers must not modify it
+        if self._graph is None:
+            self._graph = nx.DiGraph()
+            self._graph_nodes = []
+            self._graph_cursor = 0
+        G = self._graph
         
-        # Add nodes (commits)
-        for commit_id, commit in self.commits.items():
-            G.add_node(commit_id, label=commit_id)
+        # Undo hides the newest commits, redo shows them again, and commits
+        # past a truncate were replaced by new ones
+        events, self._graph_cursor = self.changes.since(self._graph_cursor)
+        keep = min([len(self._graph_nodes), self.commit_count] +
+                   [value for kind, value in events if kind == 'truncate'])
+        G.remove_nodes_from(self._graph_nodes[keep:])
+        del self._graph_nodes[keep:]
+        for index in range(keep, self.commit_count):
+            commit = self.commits.commit(index)
+            self._graph_nodes.append(commit.id)
+            
+            # Add node (commit)
+            G.add_node(commit.id, label=commit.id)
             
             # Add edges (parent relationships)
             if commit.parent:
-                G.add_edge(commit.parent, commit_id)
+                G.add_edge(commit.parent, commit.id)
             if commit.second_parent:
-                G.add_edge(commit.second_parent, commit_id)
+                G.add_edge(commit.second_parent, commit.id)
         
         return G
 
+class LaneLayout:
+    # Lane-style layered layout: the x coordinate is the commit's generation
+    # (longest path from the root) and the y coordinate is its lane. Commits
+    # are placed in creation order and a placement only looks at the parents,
+    # so the whole history is laid out in linear time and existing commits
+    # never move when new ones are added.
+    def __init__(self):
+        self.positions = {}
+        self.generations = {}
+        self.lanes = {}
+        self._continued = set()
+        self._lane_tips = []
+        self._free_lanes = []
+    
+    def compute(self, commits):
+        for commit in commits.values():
+            if commit.id not in self.positions:
+                self.place(commit)
+        return self.positions
+    
+    def place(self, commit):
+        return self.place_key(commit.id, commit.parent, commit.second_parent)
+    
+    def place_key(self, key, parent, second_parent):
+        # Commits can be keyed by anything hashable (ids, or indices into a
+        # CommitStore) as long as parents are given with the same keys
+        parents = [p for p in (parent, second_parent) if p in self.positions]
+        generation = 1 + max((self.generations[p] for p in parents), default=-1)
+        
+        # A commit continues its first parent's lane unless another child already did
+        first_parent = parents[0] if parent in self.positions else None
+        if first_parent is not None and first_parent not in self._continued:
+            lane = self.lanes[first_parent]
+            self._continued.add(first_parent)
+        else:
+            lane = self._allocate_lane(generation)
+        
+        # A branch tip merged into another lane closes its own lane for reuse
+        if second_parent in self.positions and second_parent not in self._continued:
+            merged_lane = self.lanes[second_parent]
+            if self._lane_tips[merged_lane] == self.generations[second_parent]:
+                self._continued.add(second_parent)
+                self._free_lanes.append(merged_lane)
+        
+        self.generations[key] = generation
+        self.lanes[key] = lane
+        self._lane_tips[lane] = max(self._lane_tips[lane], generation)
+        self.positions[key] = (generation, -lane)
+        return self.positions[key]
+    
+    def _allocate_lane(self, generation):
+        # Reuse the lowest closed lane that has nothing at or beyond this generation
+        for lane in sorted(self._free_lanes):
+            if self._lane_tips[lane] < generation:
+                self._free_lanes.remove(lane)
+                return lane
+        self._lane_tips.append(-1)
+        return len(self._lane_tips) - 1
+
+def layout_columns(parents, second_parents, layout=None, start=0):
+    # Lays out commits start, start+1, ... from copies of a store's parent
+    # columns, keyed by commit index. A module-level function so it can run
+    # in a worker process.
+    layout = layout or LaneLayout()
+    for index, (parent, second_parent) in enumerate(zip(parents, second_parents), start):
+        layout.place_key(index, parent if parent >= 0 else None, second_parent if second_parent >= 0 else None)
+    return layout
+
+class LayoutWorker:
+    # Runs the lane layout off the Tk thread. submit() queues a request to lay
+    # out the commits of a RepositorySnapshot; a worker thread picks up only
+    # the newest request, places the commits it has not placed yet and posts
+    # (token, stop, positions) to `results`, with positions keyed by commit
+    # id, or (token, stop, error) if the layout failed. The token names the
+    # layout the request was for, so the GUI can drop results that arrive
+    # after it started another one. Positions of the first `known` commits
+    # of a token are not posted: the GUI keeps them when commits replacing
+    # undone ones leave the rest of the history in place. A fresh layout of more
+    # than process_threshold commits runs in a separate process, where it
+    # does not compete with the Tk thread for the GIL.
+    def __init__(self, process_threshold=50000):
+        self.process_threshold = process_threshold
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self._pool = None
+        self._thread = threading.Thread(target=self._run, name='layout', daemon=True)
+        self._thread.start()
+    
+    def submit(self, token, snapshot, known=0):
+        self.requests.put((token, snapshot, known))
+    
+    def close(self):
+        self.requests.put(None)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+    
+    def _next_request(self):
+        # Requests overtaken by a newer one are dropped unseen
+        request = self.requests.get()
+        while request is not None:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+        return request
+    
+    def _run(self):
+        token = layout = None
+        placed = known = 0
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+            request_token, snapshot, request_known = request
+            store, stop = snapshot.commits, snapshot.commit_count
+            if request_token != token:
+                token, layout, placed, known = request_token, LaneLayout(), 0, request_known
+            if stop <= max(placed, known):
+                continue
+            
+            try:
+                parents, second_parents = store.parent_columns(placed, stop)
+                if placed == 0 and stop > self.process_threshold:
+                    layout = self._process_pool().submit(layout_columns, parents, second_parents).result()
+                else:
+                    layout_columns(parents, second_parents, layout, placed)
+                positions = {store.id_of(index): layout.positions[index] for index in range(max(placed, known), stop)}
+            except Exception as error:
+                # The layout may be half updated; start over on the next request
+                token = None
+                self.results.put((request_token, stop, error))
+                continue
+            placed = stop
+            self.results.put((token, stop, positions))
+    
+    def _process_pool(self):
+        if self._pool is None:
+            import concurrent.futures
+            import multiprocessing
+            # Spawned rather than forked: forking a process that runs Tk and threads is unsafe
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+class SpanIndex:
+    # Finds the items whose x span [x0, x1] overlaps a query range. Items are
+    # bucketed by where they start; the few that span more than a bucket are
+    # kept apart and checked on every query.
+    def __init__(self, bucket=64):
+        self.bucket = bucket
+        self.spans = {}
+        self._buckets = {}
+        self._long = {}
+    
+    def __len__(self):
+        return len(self.spans)
+    
+    def add(self, key, x0, x1):
+        self.spans[key] = (x0, x1)
+        if x1 - x0 > self.bucket:
+            self._long[key] = None
+        else:
+            self._buckets.setdefault(x0 // self.bucket, {})[key] = None
+    
+    def remove(self, key):
+        x0, _ = self.spans.pop(key)
+        if key in self._long:
+            del self._long[key]
+        else:
+            del self._buckets[x0 // self.bucket][key]
+    
+    def extend(self, key, x1):
+        # Also shrinks; a span that was long stays with the long ones
+        x0, old_x1 = self.spans[key]
+        self.spans[key] = (x0, x1)
+        if x1 - x0 > self.bucket >= old_x1 - x0:
+            del self._buckets[x0 // self.bucket][key]
+            self._long[key] = None
+    
+    def query(self, x0, x1):
+        spans = self.spans
+        for bucket in range(int(x0 // self.bucket) - 1, int(x1 // self.bucket) + 1):
+            for key in self._buckets.get(bucket, ()):
+                start, end = spans[key]
+                if start <= x1 and end >= x0:
+                    yield key
+        for key in self._long:
+            start, end = spans[key]
+            if start <= x1 and end >= x0:
+                yield key
+
+class GraphRenderer:
+    # Draws the part of the commit graph inside the current view. Commits,
+    # lane runs (chains of commits continuing one lane, drawn as a single
+    # segment) and the remaining edges are kept in span indexes, so a frame
+    # only visits what is on screen. The level of detail follows the zoom:
+    # full nodes and labels when commits are far apart, small nodes without
+    # commit labels further out, then only lane runs and cross-lane edges,
+    # and in the farthest views per-lane occupancy bars read from buckets a
+    # pixel or two wide. Commits are indexed in order, and the newest taken
+    # out again when an undo hides them, so an undo or redo step only touches
+    # the commits it changes. All artists are animated, clipped to the axes and
+    # blitted over a cached background. The mouse wheel zooms along the
+    # history, dragging pans and a double click returns to following the
+    # newest commits.
+    DETAIL_PIXELS = 20
+    NODE_PIXELS = 3
+    FOLLOW_SPAN = 20
+    MAX_COMMIT_LABELS = 300
+    MAX_BRANCH_LABELS = 40
+    OCCUPANCY_SIZES = tuple(4 ** level for level in range(1, 9))
+    
+    def __init__(self, ax, canvas, on_view_change=None):
+        self.ax = ax
+        self.canvas = canvas
+        self.on_view_change = on_view_change
+        
+        self.ax.set_title("Git Repository Visualization")
+        self.ax.axis('off')
+        
+        self.edges = LineCollection([], colors='gray', zorder=1, animated=True)
+        self.ax.add_collection(self.edges)
+        self.nodes = self.ax.scatter([], [], s=700, c='lightblue', zorder=2, animated=True)
+        
+        self.commit_labels = []
+        self.branch_labels = {}
+        self._frame_labels = []
+        self._background = None
+        self._drag = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.mpl_connect('scroll_event', self._on_scroll)
+        self.canvas.mpl_connect('button_press_event', self._on_press)
+        self.canvas.mpl_connect('motion_notify_event', self._on_motion)
+        self.canvas.mpl_connect('button_release_event', self._on_release)
+        self.reset()
+    
+    def reset(self):
+        for text in self.branch_labels.values():
+            text.remove()
+        self.branch_labels = {}
+        
+        self.repo = None
+        self.positions = {}
+        self.commits = SpanIndex()
+        self.runs = SpanIndex()
+        self.cross_edges = SpanIndex()
+        self._run_lanes = []
+        self._run_tails = {}
+        self._occupancy = {size: {} for size in self.OCCUPANCY_SIZES}
+        self._heads = {}
+        self._branch_heads = {}
+        self._changes_cursor = 0
+        self._max_x = None
+        # _max_x after each indexed commit, to step back on an undo
+        self._max_x_history = array('i')
+        self._has_nodes = False
+        self.follow = True
+    
+    def render(self, repo, positions):
+        # Indexes the current commits that have positions, in commit order
+        self.repo = repo
+        self.positions = positions
+        count = repo.commit_count
+        self.retract(repo.commits, count)
+        for index in range(len(self._max_x_history), count):
+            commit = repo.commits.commit(index)
+            if commit.id not in positions:
+                break
+            self._index_commit(commit)
+        self._track_branches()
+        
+        # Nothing to show until the first commits have been laid out
+        if self._max_x is None:
+            return
+        if self.follow:
+            self._follow()
+        self.draw()
+    
+    def retract(self, commits, count):
+        # Takes the indexed commits from `count` on out again, newest first,
+        # reading them from `commits`: the store they were indexed from
+        while len(self._max_x_history) > count:
+            self._unindex_commit(commits.commit(len(self._max_x_history) - 1))
+    
+    def _index_commit(self, commit):
+        positions = self.positions
+        x, y = positions[commit.id]
+        self.commits.add(commit.id, x, x)
+        self._max_x = x if self._max_x is None else max(self._max_x, x)
+        self._max_x_history.append(self._max_x)
+        for size, buckets in self._occupancy.items():
+            lanes = buckets.setdefault(x // size, {})
+            lanes[y] = lanes.get(y, 0) + 1
+        
+        # A commit continuing its first parent's lane extends that lane's run
+        parent = commit.parent
+        run = self._run_tails.pop(parent, None) if parent in positions and positions[parent][1] == y else None
+        if run is None:
+            run = len(self._run_lanes)
+            self._run_lanes.append(y)
+            self.runs.add(run, x, x)
+            parents = (parent, commit.second_parent)
+        else:
+            self.runs.extend(run, x)
+            parents = (commit.second_parent,)
+        self._run_tails[commit.id] = run
+        
+        for parent_id in parents:
+            if parent_id in positions:
+                self.cross_edges.add((parent_id, commit.id), positions[parent_id][0], x)
+    
+    def _unindex_commit(self, commit):
+        # Reverses _index_commit for the newest indexed commit
+        positions = self.positions
+        x, y = positions[commit.id]
+        self.commits.remove(commit.id)
+        self._max_x_history.pop()
+        self._max_x = self._max_x_history[-1] if self._max_x_history else None
+        for size, buckets in self._occupancy.items():
+            lanes = buckets[x // size]
+            lanes[y] -= 1
+            if not lanes[y]:
+                del lanes[y]
+                if not lanes:
+                    del buckets[x // size]
+        
+        # A run starting here was the newest one; otherwise hand the run back to the parent
+        run = self._run_tails.pop(commit.id)
+        parent = commit.parent
+        if self.runs.spans[run][0] == x:
+            self.runs.remove(run)
+            self._run_lanes.pop()
+            parents = (parent, commit.second_parent)
+        else:
+            self.runs.extend(run, positions[parent][0])
+            self._run_tails[parent] = run
+            parents = (commit.second_parent,)
+        
+        for parent_id in parents:
+            if parent_id in positions:
+                self.cross_edges.remove((parent_id, commit.id))
+    
+    def _track_branches(self):
+        # Keep a head -> branch names map up to date from the change feed
+        events, self._changes_cursor = self.repo.changes.since(self._changes_cursor)
+        for kind, name in events:
+            if kind not in ('branch', 'move', 'delete'):
+                continue
+            old_head = self._branch_heads.pop(name, None)
+            if old_head is not None:
+                self._heads[old_head].remove(name)
+                if not self._heads[old_head]:
+                    del self._heads[old_head]
+            branch = self.repo.branches.get(name)
+            if branch is not None:
+                self._branch_heads[name] = branch.head
+                self._heads.setdefault(branch.head, []).append(name)
+    
+    def _follow(self):
+        # Show the newest generations, and the lanes the commits there use
+        right = self._max_x + 1.5
+        left = max(right - self.FOLLOW_SPAN, -0.5)
+        lanes = [self.positions[commit_id][1] for commit_id in self.commits.query(left, right)]
+        top, bottom = max(lanes), min(lanes)
+        self.ax.set_xlim(left, right)
+        self.ax.set_ylim(bottom - 0.5 - max(1, (top - bottom) // 4), top + 1)
+    
+    def draw(self):
+        # Fill the artists with what is inside the view, then paint them
+        (x0, x1), (y0, y1) = self.ax.get_xlim(), self.ax.get_ylim()
+        pixels = self.ax.bbox.width / max(x1 - x0, 1e-9)
+        
+        segments = self._visible_segments(x0, x1, y0, y1, pixels)
+        self.edges.set_segments(segments)
+        
+        visible = []
+        if pixels >= self.NODE_PIXELS:
+            visible = [(commit_id, self.positions[commit_id]) for commit_id in self.commits.query(x0, x1)
+                       if y0 <= self.positions[commit_id][1] <= y1]
+        self._has_nodes = bool(visible)
+        if visible:
+            # Node diameter shrinks with the zoom, up to the full-size 700 pt^2
+            diameter = min(26.5, 0.8 * pixels * 72 / self.ax.figure.dpi)
+            self.nodes.set_offsets([position for _, position in visible])
+            self.nodes.set_sizes([diameter ** 2])
+        
+        # Zoomed out, labels would only pile up; just the current branch keeps one
+        self._frame_labels = []
+        detail = pixels >= self.DETAIL_PIXELS and len(visible) <= self.MAX_COMMIT_LABELS
+        if detail:
+            self._place_commit_labels(visible)
+        self._place_branch_labels(visible if detail else [], x0, x1, y0, y1)
+        
+        if self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_artists()
+        self.canvas.blit(self.ax.bbox)
+    
+    def _visible_segments(self, x0, x1, y0, y1, pixels):
+        sizes = [size for size in self.OCCUPANCY_SIZES if size * pixels <= 2]
+        if sizes:
+            return self._occupancy_segments(sizes[-1], x0, x1, y0, y1)
+        
+        positions = self.positions
+        segments = []
+        for run in self.runs.query(x0, x1):
+            start, end = self.runs.spans[run]
+            y = self._run_lanes[run]
+            if start < end and y0 <= y <= y1:
+                segments.append(((max(start, x0 - 1), y), (min(end, x1 + 1), y)))
+        for parent_id, commit_id in self.cross_edges.query(x0, x1):
+            (px, py), (cx, cy) = positions[parent_id], positions[commit_id]
+            if max(py, cy) >= y0 and min(py, cy) <= y1:
+                segments.append(((px, py), (cx, cy)))
+        
+        # Far out many segments land on the same pixels; keep one of each
+        if pixels < self.NODE_PIXELS:
+            scale_x = pixels
+            scale_y = self.ax.bbox.height / max(y1 - y0, 1e-9)
+            seen = {}
+            for segment in segments:
+                (ax_, ay), (bx, by) = segment
+                seen.setdefault((round(ax_ * scale_x), round(ay * scale_y),
+                                 round(bx * scale_x), round(by * scale_y)), segment)
+            segments = list(seen.values())
+        return segments
+    
+    def _occupancy_segments(self, size, x0, x1, y0, y1):
+        # One bar per lane over each stretch of consecutive occupied buckets
+        buckets = self._occupancy[size]
+        open_bars = {}
+        segments = []
+        for bucket in range(int(x0 // size), int(x1 // size) + 1):
+            for y in buckets.get(bucket, ()):
+                if not y0 <= y <= y1:
+                    continue
+                start = open_bars.get(y)
+                if start is not None and start[1] == bucket - 1:
+                    start[1] = bucket
+                else:
+                    if start is not None:
+                        segments.append(((start[0] * size, y), (start[1] * size + size - 1, y)))
+                    open_bars[y] = [bucket, bucket]
+        for y, (first, last) in open_bars.items():
+            segments.append(((first * size, y), (last * size + size - 1, y)))
+        return segments
+    
+    def _place_commit_labels(self, visible):
+        # Commit labels come from a pool of Text artists sized to the screen
+        for i, (commit_id, (x, y)) in enumerate(visible):
+            if i == len(self.commit_labels):
+                self.commit_labels.append(self.ax.text(0, 0, '', fontsize=10, ha='center', va='center',
+                                                       zorder=3, animated=True, clip_on=True))
+            text = self.commit_labels[i]
+            text.set_text(self.repo.short_id(commit_id))
+            text.set_position((x, y))
+            self._frame_labels.append(text)
+    
+    def _place_branch_labels(self, visible, x0, x1, y0, y1):
+        repo = self.repo
+        
+        # The current branch first, then the branches at the visible commits
+        names = [repo.current_branch]
+        for commit_id, _ in visible:
+            names.extend(name for name in self._heads.get(commit_id, ()) if name != repo.current_branch)
+        stacked = {}
+        shown = 0
+        for branch_name in names:
+            branch = repo.branches.get(branch_name)
+            if branch is None or branch.head not in self.positions:
+                continue
+            x, y = self.positions[branch.head]
+            if not (x0 <= x <= x1 and y0 <= y <= y1):
+                continue
+            offset = stacked.get(branch.head, 0)
+            stacked[branch.head] = offset + 1
+            
+            text = self.branch_labels.get(branch_name)
+            if text is None:
+                text = self.ax.text(x, y, branch_name, ha='center', color='white', fontweight='bold',
+                                    zorder=4, animated=True, clip_on=True,
+                                    bbox=dict(facecolor=branch.color, alpha=0.7, boxstyle='round,pad=0.5'))
+                self.branch_labels[branch_name] = text
+            text.set_position((x, y + 0.35 + 0.3 * offset))
+            is_current = branch_name == repo.current_branch
+            text.get_bbox_patch().set_edgecolor('black' if is_current else 'none')
+            self._frame_labels.append(text)
+            shown += 1
+            if shown >= self.MAX_BRANCH_LABELS:
+                break
+    
+    def _draw_artists(self):
+        self.ax.draw_artist(self.edges)
+        if self._has_nodes:
+            self.ax.draw_artist(self.nodes)
+        for text in self._frame_labels:
+            self.ax.draw_artist(text)
+    
+    def _on_draw(self, event):
+        # A full draw (first frame or window resize) caches the empty axes
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_artists()
+    
+    def _view_changed(self, follow=False):
+        self.follow = follow
+        if self.on_view_change is not None:
+            self.on_view_change()
+        elif self._max_x is not None:
+            if follow:
+                self._follow()
+            self.draw()
+    
+    def _on_scroll(self, event):
+        if event.inaxes is not self.ax:
+            return
+        # Only the history axis zooms; there are never many lanes
+        factor = 1 / 1.25 if event.button == 'up' else 1.25
+        x0, x1 = self.ax.get_xlim()
+        self.ax.set_xlim(event.xdata - (event.xdata - x0) * factor, event.xdata + (x1 - event.xdata) * factor)
+        self._view_changed()
+    
+    def _on_press(self, event):
+        if event.inaxes is not self.ax or event.button != 1:
+            return
+        if event.dblclick:
+            self._view_changed(follow=True)
+            return
+        self._drag = (event.x, event.y, self.ax.get_xlim(), self.ax.get_ylim())
+    
+    def _on_motion(self, event):
+        if self._drag is None or event.x is None:
+            return
+        start_x, start_y, (x0, x1), (y0, y1) = self._drag
+        dx = (event.x - start_x) * (x1 - x0) / self.ax.bbox.width
+        dy = (event.y - start_y) * (y1 - y0) / self.ax.bbox.height
+        self.ax.set_xlim(x0 - dx, x1 - dx)
+        self.ax.set_ylim(y0 - dy, y1 - dy)
+        self._view_changed()
+    
+    def _on_release(self, event):
+        self._drag = None
+
+# Autosave journals sit next to their snapshot file under this suffix
+JOURNAL_SUFFIX = '.journal'
+
+class RepositoryJournal:
+    # Autosave as a snapshot plus an append-only journal. flush() appends one
+    # JSON line per change published since the last flush, so saving after a
+    # command costs O(1); every `compact_every` entries the repository is
+    # written out in full and the journal starts over, as it also does when
+    # a commit replaces undone ones. load_from_file replays the journal on top
+    # of the snapshot.
+    def __init__(self, repo, filename, compact_every=1000):
+        self.repo = repo
+        self.filename = filename
+        self.compact_every = compact_every
+        self.entries = 0
+        self.cursor = 0
+        # Commits the snapshot and journal hold; a redo past them writes the rest
+        self.saved_commits = 0
+        self._file = None
+        self.compact()
+    
+    def compact(self):
+        # The journal restarts at the change the saved snapshot was taken at
+        snapshot = self.repo.snapshot()
+        snapshot.save_to_file(self.filename)
+        if self._file:
+            self._file.close()
+        self._file = open(self.filename + JOURNAL_SUFFIX, 'w')
+        self.entries = 0
+        self.cursor = snapshot.change_count
+        self.saved_commits = snapshot.commit_count
+    
+    def flush(self):
+        events, self.cursor = self.repo.changes.since(self.cursor)
+        if not events:
+            return
+        if any(kind == 'truncate' for kind, _ in events):
+            self.compact()
+            return
+        # Commits a redo brought back go first, as branch records may point at them
+        redone = max((value for kind, value in events if kind == 'count'), default=0)
+        for index in range(self.saved_commits, redone):
+            self._write(self._record('commit', index))
+        for kind, value in events:
+            record = self._record(kind, value)
+            if record is not None:
+                self._write(record)
+        self._file.flush()
+        self.entries += len(events)
+        if self.entries >= self.compact_every:
+            self.compact()
+    
+    def close(self):
+        self.flush()
+        self._file.close()
+    
+    def _write(self, record):
+        if record['op'] == 'commit':
+            self.saved_commits = max(self.saved_commits, record['index'] + 1)
+        self._file.write(json.dumps(record) + '\n')
+    
+    def _record(self, kind, value):
+        # Records carry the state at flush time; None for a branch deleted since
+        repo = self.repo
+        if kind == 'commit':
+            commit = repo.commits.commit(value)
+            return {'op': 'commit', 'index': value, 'id': commit.id, 'message': commit.message, 'parent': commit.parent,
+                    'second_parent': commit.second_parent, 'timestamp': repo.commits.timestamps[value]}
+        if kind == 'count':
+            return {'op': 'count', 'count': value}
+        if kind == 'delete':
+            return {'op': 'delete', 'name': value}
+        if kind in ('branch', 'move'):
+            branch = repo.branches.get(value)
+            if branch is None:
+                return None
+            if kind == 'branch':
+                return {'op': 'branch', **branch.to_dict()}
+            return {'op': 'move', 'name': value, 'head': branch.head}
+        return {'op': 'checkout', 'name': value}
+    
+    @staticmethod
+    def replay(repo, path):
+        with open(path, 'r') as f:
+            for line in f:
+                # A line cut short by a crash ends the journal
+                if not line.endswith('\n'):
+                    break
+                record = json.loads(line)
+                op = record['op']
+                if op == 'commit':
+                    repo._add_commit(record['id'], record['message'], record['parent'],
+                                     record['second_parent'], record['timestamp'])
+                elif op == 'branch':
+                    repo._add_branch(GitBranch(record['name'], record['head'], record['color']))
+                elif op == 'move':
+                    repo._move_branch(repo.branches[record['name']], record['head'])
+                elif op == 'delete':
+                    # Created and deleted between two flushes, the branch was never written
+                    if record['name'] in repo.branches:
+                        repo._remove_branch(record['name'])
+                elif op == 'count':
+                    repo._set_commit_count(record['count'])
+                elif op == 'checkout':
+                    repo.current_branch = record['name']
+                    repo.changes.publish('checkout', record['name'])
+
+class CommandStats:
+    # Per-command instrumentation. Each command gets a record of the wall time
+    # spent in each of its phases (command, journal, layout, render, ...) and,
+    # while allocation tracing is on, the peak memory allocated per phase.
+    # With profiling on every command runs under cProfile and the profiles of
+    # the slowest few are kept for inspection.
+    def __init__(self, history=10000):
+        self.records = deque(maxlen=history)
+        self.trace_allocations = False
+        self.profile_slowest = 0
+        self._profiles = []
+        self._profile_count = 0
+        self._profiler = None
+        self._current = None
+        self._started = None
+    
+    def begin(self, command):
+        # Returns False when a command is already being timed, so an outer
+        # caller such as the GUI can own the record and add its own phases
+        if self._current is not None:
+            return False
+        self._current = {'command': command, 'time': time.time(), 'phases': {}, 'alloc': {}}
+        if self.profile_slowest:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._started = time.perf_counter()
+        return True
+    
+    @contextlib.contextmanager
+    def phase(self, name):
+        record = self._current
+        if record is None:
+            yield
+            return
+        # Tracing can be switched by the command being timed; go by its state at the start
+        tracing = self.trace_allocations
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases = record['phases']
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+            if tracing and tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1] - base
+                record['alloc'][name] = max(record['alloc'].get(name, 0), peak)
+    
+    def end(self):
+        record, self._current = self._current, None
+        if record is None:
+            return None
+        record['total'] = time.perf_counter() - self._started
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._keep_profile(record, self._profiler)
+            self._profiler = None
+        self.records.append(record)
+        return record
+    
+    def reset(self):
+        self.records.clear()
+        self._profiles = []
+    
+    def set_trace_allocations(self, enabled):
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and self.trace_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_allocations = enabled
+    
+    def set_profile_slowest(self, count):
+        self.profile_slowest = count
+        self._profiles = heapq.nlargest(count, self._profiles) if count else []
+        heapq.heapify(self._profiles)
+    
+    def _keep_profile(self, record, profiler):
+        # Min-heap on duration: the fastest kept profile is the one to evict
+        import pstats
+        self._profile_count += 1
+        entry = (record['total'], self._profile_count, record['command'], pstats.Stats(profiler))
+        if len(self._profiles) < self.profile_slowest:
+            heapq.heappush(self._profiles, entry)
+        elif self._profiles and entry[0] > self._profiles[0][0]:
+            # Nothing is kept once the command itself turned profiling off
+            heapq.heapreplace(self._profiles, entry)
+    
+    def summary(self):
+        # One row per command and phase, plus a 'total' row per command
+        samples = {}
+        for record in self.records:
+            rows = samples.setdefault(record['command'], {})
+            rows.setdefault('total', ([], []))[0].append(record['total'])
+            for name, seconds in record['phases'].items():
+                times, allocs = rows.setdefault(name, ([], []))
+                times.append(seconds)
+                if name in record['alloc']:
+                    allocs.append(record['alloc'][name])
+        
+        summary = []
+        for command, rows in samples.items():
+            for name, (times, allocs) in rows.items():
+                times.sort()
+                summary.append({'command': command, 'phase': name, 'count': len(times),
+                                'mean_ms': sum(times) / len(times) * 1000,
+                                'p95_ms': times[math.ceil(0.95 * len(times)) - 1] * 1000,
+                                'max_ms': times[-1] * 1000,
+                                'peak_kib': max(allocs) / 1024 if allocs else None})
+        return summary
+    
+    def format_summary(self):
+        rows = self.summary()
+        if not rows:
+            return "No commands recorded yet"
+        lines = [f"{'command':<12} {'phase':<10} {'count':>6} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9} {'peak KiB':>9}"]
+        for row in rows:
+            peak = f"{row['peak_kib']:9.1f}" if row['peak_kib'] is not None else f"{'-':>9}"
+            lines.append(f"{row['command']:<12} {row['phase']:<10} {row['count']:>6} {row['mean_ms']:9.3f} "
+                         f"{row['p95_ms']:9.3f} {row['max_ms']:9.3f} {peak}")
+        return "\n".join(lines)
+    
+    def format_profiles(self, limit=15):
+        if not self._profiles:
+            return "No profiles captured"
+        import io
+        out = io.StringIO()
+        for seconds, _, command, stats in sorted(self._profiles, reverse=True):
+            out.write(f"== {command}: {seconds * 1000:.3f} ms ==\n")
+            stats.stream = out
+            stats.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue().rstrip()
+    
+    def export(self, filename):
+        # *.csv gets one row per command phase; anything else is written as JSON
+        if filename.endswith('.csv'):
+            import csv
+            with open(filename, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['command', 'time', 'phase', 'seconds', 'peak_bytes'])
+                for record in self.records:
+                    writer.writerow([record['command'], record['time'], 'total', record['total'], ''])
+                    for name, seconds in record['phases'].items():
+                        writer.writerow([record['command'], record['time'], name, seconds,
+                                         record['alloc'].get(name, '')])
+        else:
+            with open(filename, 'w') as f:
+                json.dump({'records': list(self.records), 'summary': self.summary()}, f, indent=2)
+        return len(self.records)
+
+class CommandShell:
+    # Command layer shared by the Tk console and the headless batch runner:
+    # parses console command lines and runs them against a GitRepository.
+    def __init__(self, repo=None, log_page_size=20):
+        self.repo = repo or GitRepository()
+        self.journal = None
+        self.log_page_size = log_page_size
+        self._log_pager = None
+        # The first commit of the next page, pulled to know whether there is one
+        self._log_next = None
+        self.stats = CommandStats()
+    
+    def execute(self, command):
+        args = command.split()
+        if not args:
+            return ""
+        return self.process_command(args[0].lower(), args[1:])
+    
+    def process_command(self, cmd, args):
+        owned = self.stats.begin(cmd)
+        try:
+            with self.stats.phase('command'):
+                result = self._dispatch(cmd, args)
+            if self.journal:
+                with self.stats.phase('journal'):
+                    self.journal.flush()
+        finally:
+            if owned:
+                self.stats.end()
+        return result
+    
+    def _dispatch(self, cmd, args):
+        if cmd == "help":
+            return self.show_help()
+        elif cmd == "commit":
+            message = " ".join(args) if args else "New commit"
+            success, result = self.repo.create_commit(message)
+            return result
+        elif cmd == "branch":
+            if not args:
+                return "Error: Branch name required"
+            return self.repo.create_branch(args[0])[1]
+        elif cmd == "checkout":
+            if not args:
+                return "Error: Branch name required"
+            return self.repo.checkout_branch(args[0])[1]
+        elif cmd == "merge":
+            modes = {'--ff': 'ff', '--no-ff': 'no-ff', '--ff-only': 'ff-only'}
+            mode = 'ff'
+            names = []
+            for arg in args:
+                if arg in modes:
+                    mode = modes[arg]
+                elif arg.startswith('--'):
+                    return f"Error: Unknown option {arg}"
+                else:
+                    names.append(arg)
+            if not names:
+                return "Error: Source branch required"
+            return self.repo.merge_branches(names[0], mode)[1]
+        elif cmd == "reflog":
+            return self._reflog_command(args)
+        elif cmd == "undo":
+            return self.repo.undo()[1]
+        elif cmd == "redo":
+            return self.repo.redo()[1]
+        elif cmd == "merge-base":
+            if len(args) < 2:
+                return "Error: Two branches or commits required"
+            base = self.repo.merge_base(args[0], args[1])
+            return self.repo.short_id(base) if base else f"Error: No common ancestor of '{args[0]}' and '{args[1]}'"
+        elif cmd == "log":
+            return self._start_log(args)
+        elif cmd == "more":
+            return self._log_page()
+        elif cmd == "stats":
+            return self._stats_command(args)
+        elif cmd in ("clear", "scrollback"):
+            # Console commands that only mean something in the GUI
+            return ""
+        elif cmd == "save":
+            filename = args[0] if args else "git_repo.json"
+            try:
+                if self.journal and os.path.abspath(filename) == os.path.abspath(self.journal.filename):
+                    # Saving removes the journal beside the file; let the journal
+                    # write the snapshot and start over instead
+                    self.journal.compact()
+                else:
+                    self.repo.save_to_file(filename)
+            except OSError as e:
+                return f"Error saving repository: {e}"
+            return f"Repository saved to {filename}"
+        elif cmd == "load":
+            if not args:
+                return "Error: Filename required"
+            filename = args[0]
+            if not os.path.exists(filename):
+                return f"Error: File {filename} not found"
+            try:
+                self.repo = GitRepository.load_from_file(filename)
+            except Exception as e:
+                return f"Error loading repository: {str(e)}"
+            if self.journal:
+                self.journal.close()
+                self.journal = None
+                return f"Repository loaded from {filename} (autosave stopped)"
+            return f"Repository loaded from {filename}"
+        elif cmd == "autosave":
+            if not args:
+                return f"Autosaving to {self.journal.filename}" if self.journal else "Autosave is off"
+            if self.journal:
+                self.journal.close()
+                self.journal = None
+            if args[0] == "off":
+                return "Autosave stopped"
+            try:
+                self.journal = RepositoryJournal(self.repo, args[0])
+            except OSError as e:
+                return f"Error starting autosave (autosave is off): {e}"
+            return f"Autosaving to {args[0]}"
+        else:
+            return f"Unknown command: {cmd}. Type 'help' for available commands."
+    
+    def _start_log(self, args):
+        # log [-n N] [--first-parent|--topo-order|--date-order]
+        #     [--since DATE] [--until DATE] [<revision or range>]
+        orders = {'--first-parent': 'first-parent', '--topo-order': 'topo', '--date-order': 'date'}
+        options = {'order': 'date', 'limit': None, 'since': None, 'until': None}
+        start = None
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            try:
+                if arg in orders:
+                    options['order'] = orders[arg]
+                elif arg == '-n':
+                    options['limit'] = int(args.pop(0))
+                    if options['limit'] < 0:
+                        raise ValueError(arg)
+                elif arg in ('--since', '--until'):
+                    options[arg[2:]] = datetime.datetime.fromisoformat(args.pop(0))
+                elif arg.startswith('-'):
+                    return f"Error: Unknown option {arg}"
+                else:
+                    start = arg
+            except (IndexError, ValueError):
+                return f"Error: Invalid value for {arg}"
+        
+        try:
+            self._log_pager = self.repo.iter_commits(start, **options)
+            self._log_next = None
+        except ValueError as error:
+            return f"Error: {error}"
+        return self._log_page()
+    
+    def _reflog_command(self, args):
+        # reflog [-n N] [<branch>]
+        name = None
+        limit = None
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if arg == '-n':
+                try:
+                    limit = int(args.pop(0))
+                except (IndexError, ValueError):
+                    return f"Error: Invalid value for {arg}"
+                if limit < 0:
+                    return f"Error: Invalid value for {arg}"
+            elif arg.startswith('-'):
+                return f"Error: Unknown option {arg}"
+            else:
+                name = arg
+        return self.repo.get_reflog(name, limit)
+    
+    def _log_page(self):
+        # Only one page of commits is pulled from the history walk at a time
+        if self._log_pager is None:
+            return "No log in progress"
+        commits = [] if self._log_next is None else [self._log_next]
+        commits.extend(itertools.islice(self._log_pager, self.log_page_size + 1 - len(commits)))
+        more = len(commits) > self.log_page_size
+        self._log_next = commits.pop() if more else None
+        if not more:
+            self._log_pager = None
+        
+        entries = [self.repo.format_log_entry(commit) for commit in commits]
+        if more:
+            entries.append("-- type 'more' for older commits --")
+        return "\n".join(entries) if entries else "No commits yet"
+    
+    def _stats_command(self, args):
+        stats = self.stats
+        if not args:
+            return stats.format_summary()
+        if args[0] == "reset":
+            stats.reset()
+            return "Statistics cleared"
+        if args[0] == "alloc":
+            if len(args) < 2 or args[1] not in ("on", "off"):
+                return "Error: Usage: stats alloc on|off"
+            stats.set_trace_allocations(args[1] == "on")
+            return f"Allocation tracing {args[1]}"
+        if args[0] == "profile":
+            if len(args) < 2:
+                return "Error: Usage: stats profile <N>|off|show"
+            if args[1] == "show":
+                return stats.format_profiles()
+            if args[1] == "off":
+                stats.set_profile_slowest(0)
+                return "Profiling off"
+            if not args[1].isdigit() or int(args[1]) < 1:
+                return "Error: Profile count must be a positive number"
+            stats.set_profile_slowest(int(args[1]))
+            return f"Profiling every command, keeping the slowest {args[1]}"
+        if args[0] == "export":
+            if len(args) < 2:
+                return "Error: Filename required"
+            try:
+                count = stats.export(args[1])
+            except OSError as e:
+                return f"Error exporting stats: {e}"
+            return f"Exported {count} command records to {args[1]}"
+        return f"Error: Unknown stats option {args[0]}"
+    
+    def show_help(self):
+        return """Available commands:
+- commit [message]: Create a new commit
+- branch <name>: Create a new branch
+- checkout <name>: Switch to another branch, or detach HEAD at any other revision
+- merge [--ff|--no-ff|--ff-only] <revision>: Merge another branch or commit into current
+- merge-base <a> <b>: Show the best common ancestor of two branches or commits
+- reflog [-n N] [branch]: Show where HEAD or a branch has pointed, newest first
+- undo: Undo the last commit, branch, checkout or merge
+- redo: Redo the last undone command
+- log [-n N] [--first-parent|--topo-order|--date-order] [--since DATE] [--until DATE] [rev|A..B|A...B]: Show commit history
+- more: Show the next page of the log
+- stats [reset|alloc on|off|profile <N>|off|show|export <file>]: Show per-command timings
+- clear: Clear terminal output
+- scrollback [lines]: Show or set how many lines the terminal keeps
+- save [filename]: Save repository to file (binary format for *.bin)
+- load <filename>: Load repository from file
+- autosave <filename>|off: Journal every change to <filename>
+- help: Show this help message
+Revisions: a branch, HEAD, a commit id or prefix, or branch@{n} (reflog),
+followed by ~n (nth first-parent ancestor) and ^n (nth parent)"""
+
+class ConsoleScrollback:
+    # Bounded scrollback for a Tk text widget. Text widgets slow down as they
+    # grow, so once the widget holds noticeably more than max_lines lines the
+    # oldest ones are deleted in one go. Outputs longer than collapse_lines
+    # show their first preview_lines and a link that expands the rest, unless
+    # written with fold=False (output that is already paged).
+    def __init__(self, widget, max_lines=5000, collapse_lines=60, preview_lines=20):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.collapse_lines = collapse_lines
+        self.preview_lines = preview_lines
+        self._folds = {}
+        self._fold_count = 0
+        self.widget.tag_configure('fold', foreground='#4fc3f7', underline=True)
+    
+    def write(self, text, fold=True):
+        lines = text.split('\n')
+        if fold and len(lines) > self.collapse_lines:
+            hidden = '\n'.join(lines[self.preview_lines:])
+            self.widget.insert(tk.END, '\n'.join(lines[:self.preview_lines]) + '\n')
+            self._insert_fold(hidden, len(lines) - self.preview_lines)
+        else:
+            self.widget.insert(tk.END, text)
+        self._trim()
+        self.widget.see(tk.END)
+    
+    def clear(self):
+        self.widget.delete('1.0', tk.END)
+        for tag in self._folds:
+            self.widget.tag_delete(tag)
+        self._folds.clear()
+    
+    def set_max_lines(self, max_lines):
+        self.max_lines = max_lines
+        self._trim()
+    
+    def line_count(self):
+        return int(self.widget.index('end-1c').split('.')[0])
+    
+    def _insert_fold(self, hidden, hidden_lines):
+        self._fold_count += 1
+        tag = f'fold{self._fold_count}'
+        self._folds[tag] = hidden
+        self.widget.insert(tk.END, f"[+ {hidden_lines} more lines, click to expand]", ('fold', tag))
+        if hidden.endswith('\n'):
+            self.widget.insert(tk.END, '\n')
+        self.widget.tag_bind(tag, '<Button-1>', lambda event, tag=tag: self._expand(tag))
+    
+    def _expand(self, tag):
+        ranges = self.widget.tag_ranges(tag)
+        hidden = self._folds.pop(tag, None)
+        if not ranges or hidden is None:
+            return
+        self.widget.delete(ranges[0], ranges[1])
+        self.widget.insert(ranges[0], hidden.rstrip('\n'))
+        self.widget.tag_delete(tag)
+        self._trim()
+    
+    def _trim(self):
+        # Allow some slack so trimming happens in bulk rather than per line
+        excess = self.line_count() - self.max_lines
+        if excess <= max(100, self.max_lines // 10):
+            return
+        self.widget.delete('1.0', f'{excess + 1}.0')
+        for tag in [tag for tag in self._folds if not self.widget.tag_ranges(tag)]:
+            del self._folds[tag]
+            self.widget.tag_delete(tag)
+
+class RedrawScheduler:
+    # Coalesces redraw requests into frames. request() only marks the view
+    # dirty; the callback runs once from the Tk event loop for however many
+    # requests came in, and at most max_fps times a second, so a burst of
+    # commands costs one redraw instead of one per command.
+    def __init__(self, root, callback, max_fps=30):
+        self.root = root
+        self.callback = callback
+        self.max_fps = max_fps
+        self._pending = None
+        self._last_frame = 0.0
+    
+    def request(self):
+        if self._pending is not None:
+            return
+        delay = self._last_frame + 1.0 / self.max_fps - time.perf_counter()
+        if delay > 0:
+            self._pending = self.root.after(max(1, round(delay * 1000)), self._frame)
+        else:
+            self._pending = self.root.after_idle(self._frame)
+    
+    def cancel(self):
+        if self._pending is not None:
+            self.root.after_cancel(self._pending)
+            self._pending = None
+    
+    def _frame(self):
+        self._pending = None
+        self._last_frame = time.perf_counter()
+        self.callback()
+
 class GitSimulatorApp:
-    def __init__(self, root):
+    def __init__(self, root, repo=None, max_fps=30):
         self.root = root
         self.root.title("Git Branching Simulator")
         self.root.geometry("1000x600")
         
-        self.repo = GitRepository()
+        self.shell = CommandShell(repo)
+        self.layout_worker = LayoutWorker()
+        self.positions = {}
+        self._layout_repo = None
+        self._layout_commits = None
+        self._layout_changes = 0
+        self._layout_token = 0
+        self._layout_requested = 0
+        self._layout_received = 0
+        self._layout_known = 0
+        self._layout_poll = None
+        
+        self.renderer = None
+        self.redraw = RedrawScheduler(root, self._redraw, max_fps)
         
         self._create_ui()
-        self._update_graph()
+        self.root.after_idle(self._create_graph)
+    
+    @property
+    def repo(self):
+        return self.shell.repo
     
     def _create_ui(self):
         self.root.columnconfigure(0, weight=2)
         self.root.columnconfigure(1, weight=1)
         self.root.rowconfigure(0, weight=1)
         
-        # Left panel (Graph visualization)
-        left_panel = ttk.Frame(self.root)
-        left_panel.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        
-        self.figure, self.ax = plt.subplots(figsize=(6, 4))
-        self.canvas = FigureCanvasTkAgg(self.figure, left_panel)
-        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # Left panel (Graph visualization), filled in by _create_graph
+        self.graph_panel = ttk.Frame(self.root)
+        self.graph_panel.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
         
         # Right panel (Terminal)
         right_panel = ttk.Frame(self.root)
@@ -237,9 +2685,10 @@ class GitSimulatorApp:
         # Terminal output
         self.terminal_output = scrolledtext.ScrolledText(right_panel, wrap=tk.WORD, bg='black', fg='white')
         self.terminal_output.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        self.terminal_output.insert(tk.END, "Git Branching Simulator\n")
-        self.terminal_output.insert(tk.END, "Type 'help' for available commands\n")
-        self.terminal_output.insert(tk.END, "\n")
+        self.console = ConsoleScrollback(self.terminal_output)
+        self.console.write("Git Branching Simulator\n")
+        self.console.write("Type 'help' for available commands\n")
+        self.console.write("\n")
         
         # Command input frame
         cmd_frame = ttk.Frame(right_panel)
@@ -267,113 +2716,183 @@ class GitSimulatorApp:
         if not command:
             return
         
-        self.terminal_output.insert(tk.END, f"$ {command}\n")
+        self.console.write(f"$ {command}\n")
         self.cmd_entry.delete(0, tk.END)
         
         args = command.split()
         cmd = args[0].lower()
         
-        result = self._process_command(cmd, args[1:])
-        self.terminal_output.insert(tk.END, f"{result}\n\n")
-        self.terminal_output.see(tk.END)
+        # The GUI owns the timing record so the console write is counted with the command
+        stats = self.shell.stats
+        owned = stats.begin(cmd)
+        try:
+            result = self._process_command(cmd, args[1:])
+            with stats.phase('console'):
+                # Log pages are already limited to log_page_size commits
+                self.console.write(f"{result}\n\n", fold=cmd not in ('log', 'more'))
+        finally:
+            if owned:
+                stats.end()
         
-        # Update graph and status
-        self._update_graph()
-        self._update_status()
+        # Graph and status are brought up to date in the next frame
+        self.redraw.request()
     
     def _process_command(self, cmd, args):
-        if cmd == "help":
-            return self._show_help()
-        elif cmd == "commit":
-            message = " ".join(args) if args else "New commit"
-            success, result = self.repo.create_commit(message)
-            return result
-        elif cmd == "branch":
-            if not args:
-                return "Error: Branch name required"
-            return self.repo.create_branch(args[0])[1]
-        elif cmd == "checkout":
-            if not args:
-                return "Error: Branch name required"
-            return self.repo.checkout_branch(args[0])[1]
-        elif cmd == "merge":
-            if not args:
-                return "Error: Source branch required"
-            return self.repo.merge_branches(args[0])[1]
-        elif cmd == "log":
-            return self.repo.get_commit_log()
-        elif cmd == "clear":
-            self.terminal_output.delete(1.0, tk.END)
+        if cmd == "clear":
+            self.console.clear()
             return ""
-        elif cmd == "save":
-            filename = args[0] if args else "git_repo.json"
-            self.repo.save_to_file(filename)
-            return f"Repository saved to {filename}"
-        elif cmd == "load":
+        if cmd == "scrollback":
             if not args:
-                return "Error: Filename required"
-            filename = args[0]
-            if not os.path.exists(filename):
-                return f"Error: File {filename} not found"
-            try:
-                self.repo = GitRepository.load_from_file(filename)
-                return f"Repository loaded from {filename}"
-            except Exception as e:
-                return f"Error loading repository: {str(e)}"
-        else:
-            return f"Unknown command: {cmd}. Type 'help' for available commands."
+                return f"Scrollback keeps {self.console.max_lines} lines"
+            if not args[0].isdigit() or int(args[0]) < 1:
+                return "Error: Line limit must be a positive number"
+            self.console.set_max_lines(int(args[0]))
+            return f"Scrollback set to {args[0]} lines"
+        return self.shell.process_command(cmd, args)
     
-    def _show_help(self):
-        return """Available commands:
-- commit [message]: Create a new commit
-- branch <name>: Create a new branch
-- checkout <name>: Switch to another branch
-- merge <branch>: Merge another branch into current
-- log: Show commit history
-- clear: Clear terminal output
-- save [filename]: Save repository to file
-- load <filename>: Load repository from file
-- help: Show this help message"""
+    def _redraw(self):
+        # A frame is timed as a command of its own
+        stats = self.shell.stats
+        owned = stats.begin('redraw')
+        try:
+            self._update_graph()
+            self._update_status()
+        finally:
+            if owned:
+                stats.end()
     
     def _update_status(self):
         self.status_label.config(text=f"Current branch: {self.repo.current_branch}")
     
+    def _create_graph(self):
+        _import_matplotlib()
+        self.figure = Figure(figsize=(6, 4))
+        self.ax = self.figure.add_subplot()
+        self.canvas = FigureCanvasTkAgg(self.figure, self.graph_panel)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.renderer = GraphRenderer(self.ax, self.canvas, self.redraw.request)
+        self.redraw.request()
+    
     def _update_graph(self):
-        self.ax.clear()
-        
-        # Get graph from repository
-        G = self.repo.build_graph()
-        
-        # Use hierarchical layout
-        pos = nx.spring_layout(G, seed=42)
-        
-        # Draw nodes
-        nx.draw_networkx_nodes(G, pos, node_color='lightblue', node_size=700, ax=self.ax)
-        
-        # Draw edges
-        nx.draw_networkx_edges(G, pos, edge_color='gray', arrows=True, ax=self.ax)
+        # Commands typed before the graph panel exists are picked up when it is built
+        if self.renderer is None:
+            return
         
-        # Draw labels
-        nx.draw_networkx_labels(G, pos, font_size=10, ax=self.ax)
+        # A loaded repository starts the view afresh. A commit that replaces
+        # undone ones swaps the commit table for a shorter copy; only the
+        # commits it drops leave the view. Undo and redo only change how many
+        # commits are shown, and the layout keeps them all.
+        snapshot = self.repo.snapshot()
+        events, self._layout_changes = self.repo.changes.since(self._layout_changes, snapshot.change_count)
+        if self._layout_repo is not self.repo:
+            self._layout_repo = self.repo
+            self._layout_commits = snapshot.commits
+            self._reset_layout(0)
+        elif self._layout_commits is not snapshot.commits:
+            kept = min(value for kind, value in events if kind == 'truncate')
+            self._drop_layout(kept)
+            self._layout_commits = snapshot.commits
         
-        # Draw branch labels
-        for branch_name, branch in self.repo.branches.items():
-            commit_id = branch.head
-            if commit_id in pos:
-                x, y = pos[commit_id]
-                color = branch.color
-                is_current = branch_name == self.repo.current_branch
-                self.ax.text(x, y + 0.1, branch_name, 
-                           bbox=dict(facecolor=color, alpha=0.7, edgecolor='black' if is_current else 'none', boxstyle='round,pad=0.5'),
-                           ha='center', color='white', fontweight='bold')
+        stats = self.shell.stats
+        with stats.phase('layout'):
+            # Ask the layout worker for any new commits, and take whatever it has finished
+            if snapshot.commit_count > self._layout_requested:
+                self.layout_worker.submit(self._layout_token, snapshot, self._layout_known)
+                self._layout_requested = snapshot.commit_count
+            self._collect_layout()
         
-        self.ax.set_title("Git Repository Visualization")
-        self.ax.axis('off')
+        with stats.phase('render'):
+            self.renderer.render(self.repo, self.positions)
         
-        # Update canvas
-        self.canvas.draw()
+        # Keep drawing frames until the worker has caught up
+        if self._layout_received < self._layout_requested and self._layout_poll is None:
+            self._layout_poll = self.root.after(20, self._poll_layout)
+    
+    def _reset_layout(self, laid_out, known=0):
+        # A new token makes the GUI ignore late results for the old layout.
+        # The positions and drawing of the first `known` commits are kept.
+        self._layout_token += 1
+        self._layout_requested = self._layout_received = laid_out
+        self._layout_known = known
+        if not known:
+            self.positions = {}
+            self.renderer.reset()
+    
+    def _drop_layout(self, kept):
+        # Forgets the commits from `kept` on, which the old commit table
+        # still holds, and lays out what replaces them
+        old_commits = self._layout_commits
+        self.renderer.retract(old_commits, kept)
+        laid_out = min(kept, self._layout_received)
+        for index in range(laid_out, self._layout_received):
+            del self.positions[old_commits.id_of(index)]
+        self._reset_layout(laid_out, laid_out)
+    
+    def _collect_layout(self):
+        while True:
+            try:
+                token, stop, positions = self.layout_worker.results.get_nowait()
+            except queue.Empty:
+                return
+            if token != self._layout_token:
+                continue
+            if isinstance(positions, Exception):
+                # Clear the graph and lay everything out afresh with the next commit
+                self.console.write(f"Error: Layout failed: {positions}\n\n")
+                self._reset_layout(self.repo.commit_count)
+                return
+            self.positions.update(positions)
+            self._layout_received = stop
+    
+    def _poll_layout(self):
+        self._layout_poll = None
+        self.redraw.request()
 
-if __name__ == "__main__":
+def run_batch(script, out=sys.stdout, repo=None):
+    # Replays console commands from a file object through a fresh shell,
+    # echoing each command like the Tk terminal does. A command that fails
+    # is reported and the replay carries on with the next one.
+    shell = CommandShell(repo)
+    for line in script:
+        command = line.strip()
+        if not command or command.startswith('#'):
+            continue
+        try:
+            result = shell.execute(command)
+        except Exception as error:
+            result = f"Error: {error}"
+        out.write(f"$ {command}\n{result}\n\n")
+    return shell
+
+def main(argv=None):
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Git Branching Simulator")
+    parser.add_argument('--batch', nargs='?', const='-', metavar='SCRIPT',
+                        help="run commands from SCRIPT (or stdin) without the GUI")
+    parser.add_argument('--content-ids', action='store_true',
+                        help="identify commits by a hash of their content instead of C<n>")
+    parser.add_argument('--max-fps', type=float, default=30,
+                        help="redraw the graph at most this many times a second (default 30)")
+    args = parser.parse_args(argv)
+    if args.max_fps <= 0:
+        parser.error("--max-fps must be positive")
+    repo = GitRepository(content_ids=args.content_ids)
+    
+    if args.batch is not None:
+        if args.batch == '-':
+            run_batch(sys.stdin, repo=repo)
+        else:
+            with open(args.batch, 'r') as f:
+                run_batch(f, repo=repo)
+        return 0
+    
+    _import_tk()
     root = tk.Tk()
-    app = GitSimulatorApp(root)
-    root.mainloop()
\ No newline at end of file
+    app = GitSimulatorApp(root, repo, args.max_fps)
+    root.mainloop()
+    app.layout_worker.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import argparse
+import itertools
+import threading
+import multiprocessing
+import zlib
+
+from main import CommandShell, CommandStats
+
+# Multi-tenant server mode: one asyncio front end accepting JSON-lines
+# requests over TCP or a Unix socket, and a fixed set of shard processes that
+# each host many independent repository sessions. A session always lives on
+# the same shard, so its commands run in order, and all command work (merges,
+# logs, saves) happens in the shards, never on the event loop.
+#
+# Request:  {"id": 1, "session": "alice", "command": "commit hello"}
+# Response: {"id": 1, "session": "alice", "output": "Created commit C1: hello"}
+# {"session": "alice", "close": true} drops a session. Malformed requests get
+# {"id": ..., "error": "Error: ..."}.
+
+# Commands whose arguments name files; without --data-dir they are refused,
+# with it they are confined to a directory per session
+FILE_COMMANDS = {'save', 'load', 'autosave'}
+
+def _sandbox_command(command, session, data_dir):
+    # Returns the command with its file arguments moved into the session's
+    # directory, or None if file commands are disabled
+    args = command.split()
+    cmd = args[0].lower() if args else None
+    if cmd in FILE_COMMANDS:
+        keep = 1
+    elif cmd == 'stats' and args[1:2] == ['export']:
+        keep = 2
+    else:
+        return command
+    if data_dir is None:
+        return None
+    
+    # Session names are client supplied; the checksum keeps similar names apart
+    safe_name = ''.join(c for c in session if c.isalnum() or c in '-_')[:40]
+    session_dir = os.path.join(data_dir, f"{zlib.crc32(session.encode()):08x}-{safe_name}")
+    os.makedirs(session_dir, exist_ok=True)
+    file_args = [arg if arg == 'off' else os.path.join(session_dir, os.path.basename(arg)) for arg in args[keep:]]
+    if cmd == 'save' and not file_args:
+        # The default filename would land in the server's working directory
+        file_args = [os.path.join(session_dir, 'git_repo.json')]
+    return ' '.join(args[:keep] + file_args)
+
+def run_shard(conn, data_dir, stats_history):
+    # Shard process main loop: requests are (request_id, session, command),
+    # with command None to close the session
+    sessions = {}
+    while True:
+        try:
+            request_id, session, command = conn.recv()
+        except EOFError:
+            return
+        if command is None:
+            shell = sessions.pop(session, None)
+            if shell is not None and shell.journal:
+                shell.journal.close()
+            conn.send((request_id, "Session closed"))
+            continue
+        
+        shell = sessions.get(session)
+        if shell is None:
+            shell = sessions[session] = CommandShell()
+            shell.stats = CommandStats(history=stats_history)
+        
+        sandboxed = _sandbox_command(command, session, data_dir)
+        if sandboxed is None:
+            output = "Error: File commands are disabled on this server"
+        else:
+            try:
+                output = shell.execute(sandboxed)
+            except Exception as error:
+                output = f"Error: {error}"
+        conn.send((request_id, output))
+
+class Shard:
+    # Front-end handle for one shard process. Requests are queued for a sender
+    # thread and replies picked up by a reader thread, so the event loop
+    # never blocks on the pipe; each reply resolves the future its id maps to.
+    # A shard process that dies is replaced by a fresh one: the requests it
+    # held fail, and its sessions start over empty.
+    def __init__(self, context, data_dir, stats_history):
+        self._context = context
+        self._args = (data_dir, stats_history)
+        self._ids = itertools.count()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._closing = False
+        self.restarts = 0
+        self.conn, self.process, self._outgoing = self._start()
+    
+    def _start(self):
+        conn, child = self._context.Pipe()
+        process = self._context.Process(target=run_shard, args=(child, *self._args), daemon=True)
+        process.start()
+        child.close()
+        outgoing = queue.Queue()
+        threading.Thread(target=self._send_loop, args=(conn, outgoing), daemon=True).start()
+        threading.Thread(target=self._receive_loop, args=(conn, outgoing), daemon=True).start()
+        return conn, process, outgoing
+    
+    def request(self, session, command):
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        with self._lock:
+            if self._closing:
+                future.set_result("Error: Server is shutting down")
+                return future
+            request_id = next(self._ids)
+            self._futures[request_id] = future
+            self._outgoing.put((request_id, session, command))
+        return future
+    
+    def close(self):
+        with self._lock:
+            self._closing = True
+            self._outgoing.put(None)
+        self.process.join(timeout=5)
+    
+    def _send_loop(self, conn, outgoing):
+        while True:
+            message = outgoing.get()
+            if message is None:
+                conn.close()
+                return
+            try:
+                conn.send(message)
+            except (OSError, ValueError):
+                # The process is gone; the receive loop replaces it
+                self._fail([message[0]], "Error: Session host exited")
+    
+    def _receive_loop(self, conn, outgoing):
+        started = time.monotonic()
+        while True:
+            try:
+                request_id, output = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._futures.pop(request_id, None)
+            if future is not None:
+                self._loop.call_soon_threadsafe(_resolve, future, output)
+        if self._closing:
+            return
+        
+        # The shard died: start a replacement outside the lock (spawning is
+        # slow), then fail whatever was sent to the old one
+        if time.monotonic() - started < 1:
+            time.sleep(1)
+        replacement = self._start()
+        with self._lock:
+            self.conn, self.process, self._outgoing = replacement
+            self.restarts += 1
+            lost = list(self._futures)
+            outgoing.put(None)
+            if self._closing:
+                self._outgoing.put(None)
+        print(f"Shard process exited; restarted it (pid {self.process.pid})", file=sys.stderr, flush=True)
+        self._fail(lost, "Error: Session host exited; its sessions were reset")
+    
+    def _fail(self, request_ids, output):
+        with self._lock:
+            futures = [self._futures.pop(request_id, None) for request_id in request_ids]
+        for future in futures:
+            if future is not None:
+                self._loop.call_soon_threadsafe(_resolve, future, output)
+
+def _resolve(future, output):
+    if not future.done():
+        future.set_result(output)
+
+class ShardPool:
+    def __init__(self, workers, data_dir=None, stats_history=200):
+        # Spawned rather than forked so shards start from a clean interpreter
+        context = multiprocessing.get_context('spawn')
+        self.shards = [Shard(context, data_dir, stats_history) for _ in range(workers)]
+    
+    def shard_for(self, session):
+        return self.shards[zlib.crc32(session.encode()) % len(self.shards)]
+    
+    async def execute(self, session, command):
+        return await self.shard_for(session).request(session, command)
+    
+    async def close_session(self, session):
+        return await self.shard_for(session).request(session, None)
+    
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+class SimulatorServer:
+    def __init__(self, pool):
+        self.pool = pool
+        self.connections = 0
+    
+    async def handle(self, reader, writer):
+        # Requests on one connection are answered in order
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.respond(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # ValueError: a request line longer than the stream limit
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+    
+    async def respond(self, line):
+        try:
+            request = json.loads(line)
+            session = request['session']
+            if not isinstance(session, str) or not session:
+                raise ValueError("session must be a non-empty string")
+        except (ValueError, KeyError, TypeError) as error:
+            return {'error': f"Error: Bad request: {error}"}
+        
+        response = {'session': session}
+        if 'id' in request:
+            response['id'] = request['id']
+        if request.get('close'):
+            response['output'] = await self.pool.close_session(session)
+            return response
+        command = request.get('command')
+        if not isinstance(command, str):
+            response['error'] = "Error: Command required"
+            return response
+        response['output'] = await self.pool.execute(session, command)
+        return response
+
+async def serve(host='127.0.0.1', port=8765, workers=None, data_dir=None, unix_socket=None, ready=None):
+    pool = ShardPool(workers or os.cpu_count() or 1, data_dir)
+    server = SimulatorServer(pool)
+    # Long log pages make for long lines
+    limit = 1 << 20
+    try:
+        if unix_socket:
+            listener = await asyncio.start_unix_server(server.handle, unix_socket, limit=limit)
+        else:
+            listener = await asyncio.start_server(server.handle, host, port, limit=limit)
+        address = unix_socket or '%s:%d' % listener.sockets[0].getsockname()[:2]
+        print(f"Serving {len(pool.shards)} shards on {address}", file=sys.stderr, flush=True)
+        if ready is not None:
+            ready(listener)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        pool.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Git Branching Simulator sessions over a socket")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help="TCP port (0 picks a free one)")
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, help="shard processes (default: one per CPU)")
+    parser.add_argument('--data-dir', help="allow save/load/autosave, confined to a directory per session")
+    args = parser.parse_args(argv)
+    
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.data_dir, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
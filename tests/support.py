@@ -0,0 +1,45 @@
+import random
+
+from main import GitRepository
+
+# Shared by the test modules. Run them from the repository root with:
+#     python -m unittest
+
+def random_history(seed, steps=300, content_ids=False):
+    # Commits, branches, checkouts and merges in random order
+    rng = random.Random(seed)
+    repo = GitRepository(content_ids=content_ids)
+    names = ['master']
+    for step in range(steps):
+        roll = rng.random()
+        if roll < 0.5:
+            repo.create_commit(f"commit {step}")
+        elif roll < 0.6:
+            name = f"b{step}"
+            repo.create_branch(name)
+            names.append(name)
+        elif roll < 0.8:
+            repo.checkout_branch(rng.choice(names))
+        else:
+            repo.merge_branches(rng.choice(names), rng.choice(['ff', 'no-ff']))
+    return repo
+
+def all_ancestors(commits):
+    # Index -> set of itself and all its ancestors, by brute force
+    ancestors = []
+    for index in range(len(commits)):
+        found = {index}
+        for parent in (commits.parents[index], commits.second_parents[index]):
+            if parent >= 0:
+                found |= ancestors[parent]
+        ancestors.append(found)
+    return ancestors
+
+def repository_state(repo):
+    commits = []
+    for index in range(repo.commit_count):
+        commit = repo.commits.commit(index)
+        commits.append((commit.id, commit.message, commit.parent, commit.second_parent,
+                        repo.commits.timestamps[index]))
+    branches = {name: branch.head for name, branch in repo.branches.items()}
+    return commits, branches, repo.current_branch
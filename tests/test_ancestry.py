@@ -0,0 +1,43 @@
+import random
+import unittest
+
+from main import CommandShell, GitRepository
+from tests.support import all_ancestors, random_history
+
+class AncestryTest(unittest.TestCase):
+    def setUp(self):
+        self.repos = [random_history(seed) for seed in range(4)]
+    
+    def test_is_ancestor_and_merge_base(self):
+        rng = random.Random(0)
+        for repo in self.repos:
+            commits = repo.commits
+            ancestors = all_ancestors(commits)
+            for _ in range(300):
+                a, b = rng.randrange(len(commits)), rng.randrange(len(commits))
+                self.assertEqual(commits.is_ancestor(a, b), a in ancestors[b])
+                
+                # A best common ancestor is not an ancestor of another common ancestor
+                common = ancestors[a] & ancestors[b]
+                base = commits.merge_base(a, b)
+                self.assertIn(base, common)
+                self.assertFalse(any(base in ancestors[other] for other in common if other != base))
+    
+    def test_merge_base_of_branches(self):
+        repo = GitRepository()
+        repo.create_commit('shared')
+        repo.create_branch('feature')
+        repo.checkout_branch('feature')
+        repo.create_commit('on feature')
+        repo.checkout_branch('master')
+        repo.create_commit('on master')
+        self.assertEqual(repo.merge_base('master', 'feature'), 'C1')
+        self.assertEqual(repo.merge_base('C3', 'C2'), 'C1')
+        self.assertIsNone(repo.merge_base('master', 'nope'))
+        
+        shell = CommandShell(repo)
+        self.assertEqual(shell.execute('merge-base master feature'), 'C1')
+        self.assertTrue(shell.execute('merge-base master').startswith('Error'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from main import run_batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class BatchTest(unittest.TestCase):
+    def test_commands_are_echoed_with_their_output(self):
+        out = io.StringIO()
+        shell = run_batch(io.StringIO("# a comment\n\ncommit first\nbranch side\n"), out)
+        self.assertEqual(out.getvalue(), "$ commit first\nCreated commit C1: first\n\n"
+                                         "$ branch side\nCreated branch 'side' at commit C1\n\n")
+        self.assertIn('side', shell.repo.branches)
+    
+    def test_failing_command_does_not_stop_the_script(self):
+        directory = tempfile.mkdtemp()
+        try:
+            missing = os.path.join(directory, 'missing', 'repo.json')
+            out = io.StringIO()
+            shell = run_batch(io.StringIO(f"commit a\nsave {missing}\ncommit b\n"), out)
+            self.assertIn(f"$ save {missing}\nError", out.getvalue())
+            self.assertEqual(shell.repo.commit_count, 3)
+        finally:
+            shutil.rmtree(directory)
+    
+    def test_batch_mode_needs_no_gui_libraries(self):
+        code = ("import io, sys, main; main.run_batch(io.StringIO('commit a\\nlog\\n'), io.StringIO()); "
+                "print(sorted(name for name in ('tkinter', 'matplotlib', 'networkx') if name in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+
+from main import CommandShell, CommitStore, GitRepository, content_commit_id
+from tests.support import random_history
+
+class ContentIdTest(unittest.TestCase):
+    def test_ids_hash_the_commit_content(self):
+        commit_id = content_commit_id('message', 'a' * 40, None, 123)
+        self.assertEqual(len(commit_id), 40)
+        self.assertEqual(commit_id, content_commit_id('message', 'a' * 40, None, 123))
+        self.assertNotEqual(commit_id, content_commit_id('message', 'a' * 40, None, 124))
+        self.assertNotEqual(commit_id, content_commit_id('other', 'a' * 40, None, 123))
+    
+    def test_equal_commits_are_stored_once(self):
+        repo = GitRepository(content_ids=True)
+        repo.create_branch('other')
+        with mock.patch('main.time.time_ns', return_value=1_000_000_000):
+            repo.create_commit('same')
+            repo.checkout_branch('other')
+            repo.create_commit('same')
+        self.assertEqual(repo.commit_count, 2)
+        self.assertEqual(repo.branches['master'].head, repo.branches['other'].head)
+    
+    def test_import_copies_only_missing_commits(self):
+        source = random_history(9, content_ids=True)
+        target = GitRepository(content_ids=True)
+        self.assertEqual(target.import_commits(source), source.commit_count)
+        self.assertLessEqual(source.commit_ids(), target.commit_ids())
+        self.assertEqual(target.import_commits(source), 0)
+        
+        # Undone commits are not part of the history to import
+        source.create_commit('kept')
+        source.create_commit('undone')
+        source.undo()
+        self.assertEqual(target.import_commits(source), 1)
+        self.assertEqual(source.commit_ids() - target.commit_ids(), set())
+        
+        with self.assertRaises(ValueError):
+            target.import_commits(GitRepository())
+    
+    def test_prefix_lookup(self):
+        repo = random_history(10, content_ids=True)
+        for index in range(0, repo.commit_count, 7):
+            commit_id = repo.commits.id_of(index)
+            self.assertEqual(repo.resolve_commit(commit_id[:7]), commit_id)
+            self.assertEqual(repo.resolve_commit(commit_id), commit_id)
+            self.assertIsNone(repo.resolve_commit(commit_id[:3]))
+        self.assertIsNone(repo.resolve_commit('0000000'))
+        
+        shell = CommandShell(repo)
+        head = repo.branches[repo.current_branch].head
+        self.assertEqual(shell.execute(f"merge-base {head[:5]} {head}"), head[:7])
+    
+    def test_ambiguous_prefix(self):
+        store = CommitStore()
+        store.append('abcd1' + '0' * 35, 'one')
+        store.append('abcd2' + '0' * 35, 'two')
+        self.assertEqual(store.resolve('abcd2'), 1)
+        with self.assertRaises(ValueError):
+            store.resolve('abcd')
+        with self.assertRaises(KeyError):
+            store.resolve('abce')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import importlib.util
+import random
+import unittest
+
+from main import GitRepository
+
+def expected_graph(repo):
+    nodes, edges = set(), set()
+    for index in range(repo.commit_count):
+        commit = repo.commits.commit(index)
+        nodes.add(commit.id)
+        for parent in (commit.parent, commit.second_parent):
+            if parent:
+                edges.add((parent, commit.id))
+    return nodes, edges
+
+@unittest.skipUnless(importlib.util.find_spec('networkx'), "networkx is not installed")
+class BuildGraphTest(unittest.TestCase):
+    def test_graph_follows_changes(self):
+        rng = random.Random(0)
+        repo = GitRepository()
+        names = ['master']
+        for step in range(400):
+            roll = rng.random()
+            if roll < 0.4:
+                repo.create_commit(f"commit {step}")
+            elif roll < 0.5:
+                repo.create_branch(f"b{step}")
+                names.append(f"b{step}")
+            elif roll < 0.6:
+                repo.checkout_branch(rng.choice(names))
+            elif roll < 0.7:
+                repo.merge_branches(rng.choice(names), 'no-ff')
+            elif roll < 0.85:
+                repo.undo()
+            else:
+                repo.redo()
+            names = [name for name in names if name in repo.branches]
+            if rng.random() < 0.5:
+                graph = repo.build_graph()
+                self.assertEqual((set(graph.nodes), set(graph.edges)), expected_graph(repo))
+        
+        # The same graph is kept and updated rather than built again
+        graph = repo.build_graph()
+        repo.create_commit('last')
+        self.assertIs(repo.build_graph(), graph)
+        self.assertEqual((set(graph.nodes), set(graph.edges)), expected_graph(repo))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import JOURNAL_SUFFIX, CommandShell, GitRepository, RepositoryJournal
+from tests.support import repository_state
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def path(self, name):
+        return os.path.join(self.directory, name)
+    
+    def test_journal_replay(self):
+        shell = CommandShell()
+        for command in [f"autosave {self.path('auto.json')}", 'commit one', 'branch side', 'checkout side',
+                        'commit two', 'checkout master', 'merge --no-ff side']:
+            shell.execute(command)
+        shell.journal.close()
+        loaded = GitRepository.load_from_file(self.path('auto.json'))
+        self.assertEqual(repository_state(loaded), repository_state(shell.repo))
+    
+    def test_save_to_autosave_file_keeps_journaling(self):
+        shell = CommandShell()
+        for command in [f"autosave {self.path('auto.json')}", 'commit one', f"save {self.path('auto.json')}",
+                        'commit two', 'commit three']:
+            shell.execute(command)
+        shell.journal.close()
+        loaded = GitRepository.load_from_file(self.path('auto.json'))
+        self.assertEqual(repository_state(loaded), repository_state(shell.repo))
+    
+    def test_torn_journal_line_is_ignored(self):
+        shell = CommandShell()
+        for command in [f"autosave {self.path('auto.bin')}", 'commit one']:
+            shell.execute(command)
+        shell.journal.close()
+        expected = repository_state(shell.repo)
+        with open(self.path('auto.bin.journal'), 'a') as f:
+            f.write('{"op": "commit", "id"')
+        loaded = GitRepository.load_from_file(self.path('auto.bin'))
+        self.assertEqual(repository_state(loaded), expected)
+    
+    def test_journal_is_compacted(self):
+        repo = GitRepository()
+        journal = RepositoryJournal(repo, self.path('auto.bin'), compact_every=10)
+        for step in range(23):
+            repo.create_commit(f"commit {step}")
+            journal.flush()
+        journal.close()
+        # Each commit is a commit and a move entry; only those since the last compaction remain
+        with open(self.path('auto.bin') + JOURNAL_SUFFIX) as f:
+            self.assertEqual(len(f.readlines()), 2 * 23 % 10)
+        loaded = GitRepository.load_from_file(self.path('auto.bin'))
+        self.assertEqual(repository_state(loaded), repository_state(repo))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import random
+import unittest
+
+from main import GitRepository, LaneLayout, layout_columns
+from tests.support import random_history
+
+class LaneLayoutTest(unittest.TestCase):
+    def test_commits_are_layered_by_generation(self):
+        for seed in range(4):
+            commits = random_history(seed).commits
+            layout = layout_columns(*commits.parent_columns())
+            positions = [layout.positions[index] for index in range(len(commits))]
+            self.assertEqual(len(set(positions)), len(positions))
+            for index, (x, _) in enumerate(positions):
+                self.assertEqual(x, commits.generations[index])
+    
+    def test_first_parent_chain_keeps_its_lane(self):
+        repo = GitRepository()
+        for step in range(5):
+            repo.create_commit(f"main {step}")
+        repo.checkout_branch('C2')
+        repo.create_commit('side')
+        layout = layout_columns(*repo.commits.parent_columns())
+        lanes = [layout.positions[index][1] for index in range(len(repo.commits))]
+        self.assertEqual(lanes[:6], [0] * 6)
+        self.assertNotEqual(lanes[6], 0)
+        
+        # Laying the same history out again gives the same picture
+        self.assertEqual(layout_columns(*repo.commits.parent_columns()).positions, layout.positions)
+    
+    def test_incremental_layout_matches_full_layout(self):
+        rng = random.Random(3)
+        commits = random_history(3, steps=600).commits
+        full = layout_columns(*commits.parent_columns())
+        layout, placed = LaneLayout(), 0
+        while placed < len(commits):
+            stop = min(len(commits), placed + rng.randrange(1, 40))
+            before = dict(layout.positions)
+            layout_columns(*commits.parent_columns(placed, stop), layout, placed)
+            # Commits already placed never move
+            self.assertEqual({key: layout.positions[key] for key in before}, before)
+            placed = stop
+        self.assertEqual(layout.positions, full.positions)
+    
+    def test_compute_places_only_new_commits(self):
+        repo = random_history(4)
+        layout = LaneLayout()
+        layout.compute(repo.commits)
+        before = dict(layout.positions)
+        repo.create_commit('one more')
+        positions = layout.compute(repo.commits)
+        self.assertEqual(len(positions), len(before) + 1)
+        self.assertEqual({key: positions[key] for key in before}, before)
+        self.assertEqual(positions, LaneLayout().compute(repo.commits))
+
+if __name__ == '__main__':
+    unittest.main()
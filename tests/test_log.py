@@ -0,0 +1,89 @@
+import datetime
+import unittest
+
+from main import CommandShell, GitRepository
+from tests.support import all_ancestors, random_history
+
+class LogTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = random_history(11, steps=400)
+    
+    def test_orders(self):
+        repo, commits = self.repo, self.repo.commits
+        head = commits.index_of(repo.branches[repo.current_branch].head)
+        ancestors = all_ancestors(commits)[head]
+        
+        chain = [head]
+        while commits.parents[chain[-1]] >= 0:
+            chain.append(commits.parents[chain[-1]])
+        walked = [commits.index_of(commit.id) for commit in repo.iter_commits(order='first-parent')]
+        self.assertEqual(walked, chain)
+        
+        walked = [commits.index_of(commit.id) for commit in repo.iter_commits(order='topo')]
+        self.assertEqual(sorted(walked), sorted(ancestors))
+        seen = set()
+        for index in walked:
+            # Children come before their parents
+            self.assertFalse(seen & {commits.parents[index], commits.second_parents[index]})
+            seen.add(index)
+        
+        walked = list(repo.iter_commits(order='date'))
+        self.assertEqual(sorted(commits.index_of(commit.id) for commit in walked), sorted(ancestors))
+        timestamps = [commit.timestamp for commit in walked]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+    
+    def test_limit_and_dates(self):
+        repo = self.repo
+        everything = list(repo.iter_commits())
+        self.assertEqual([commit.id for commit in repo.iter_commits(limit=5)],
+                         [commit.id for commit in everything[:5]])
+        
+        middle = everything[len(everything) // 2].timestamp
+        since = list(repo.iter_commits(since=middle))
+        until = list(repo.iter_commits(until=middle))
+        self.assertTrue(all(commit.timestamp >= middle for commit in since))
+        self.assertTrue(all(commit.timestamp <= middle for commit in until))
+        at_middle = sum(commit.timestamp == middle for commit in everything)
+        self.assertEqual(len(since) + len(until), len(everything) + at_middle)
+    
+    def test_ranges(self):
+        repo = GitRepository()
+        repo.create_commit('base')
+        repo.create_branch('feature')
+        repo.create_commit('on master')
+        repo.checkout_branch('feature')
+        repo.create_commit('on feature')
+        self.assertEqual([commit.id for commit in repo.iter_commits('master..feature')], ['C3'])
+        self.assertEqual(sorted(commit.id for commit in repo.iter_commits('master...feature')), ['C2', 'C3'])
+        with self.assertRaises(ValueError):
+            repo.iter_commits('nope..feature')
+    
+    def test_paging(self):
+        repo = GitRepository()
+        for step in range(7):
+            repo.create_commit(f"commit {step}")
+        shell = CommandShell(repo, log_page_size=3)
+        pages = [shell.execute('log')]
+        while pages[-1].endswith("-- type 'more' for older commits --"):
+            pages.append(shell.execute('more'))
+        self.assertEqual([page.count('Commit: ') for page in pages], [3, 3, 2])
+        self.assertEqual(shell.execute('more'), "No log in progress")
+        
+        # A history that fills the last page exactly has no 'more' prompt after it
+        repo.create_commit('one more')
+        pages = [shell.execute('log'), shell.execute('more'), shell.execute('more')]
+        self.assertEqual([page.count('Commit: ') for page in pages], [3, 3, 3])
+        self.assertFalse(pages[-1].endswith("older commits --"))
+    
+    def test_options(self):
+        shell = CommandShell(self.repo)
+        self.assertEqual(shell.execute('log -n 2 --first-parent').count('Commit: '), 2)
+        self.assertEqual(shell.execute('log -n -5'), "Error: Invalid value for -n")
+        self.assertEqual(shell.execute('log --since yesterday'), "Error: Invalid value for --since")
+        self.assertEqual(shell.execute('log --oneline'), "Error: Unknown option --oneline")
+        
+        tomorrow = (datetime.datetime.now() + datetime.timedelta(days=1)).isoformat()
+        self.assertEqual(shell.execute(f"log --since {tomorrow}"), "No commits yet")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from main import CommandShell, GitRepository
+
+class MergeTest(unittest.TestCase):
+    def test_merge_modes(self):
+        repo = GitRepository()
+        repo.create_branch('feature')
+        repo.checkout_branch('feature')
+        repo.create_commit('on feature')
+        repo.checkout_branch('master')
+        self.assertTrue(repo.merge_branches('feature', 'ff')[1].startswith('Fast-forward'))
+        
+        repo.create_commit('on master')
+        repo.checkout_branch('feature')
+        repo.create_commit('more on feature')
+        self.assertFalse(repo.merge_branches('master', 'ff-only')[0])
+        success, _ = repo.merge_branches('master', 'no-ff')
+        self.assertTrue(success)
+        head = repo.commits.commit(repo.commits.index_of(repo.branches['feature'].head))
+        self.assertIsNotNone(head.second_parent)
+    
+    def test_already_merged_and_unknown_mode(self):
+        repo = GitRepository()
+        repo.create_branch('feature')
+        repo.create_commit('on master')
+        self.assertEqual(repo.merge_branches('feature'), (True, "Already up to date. Nothing to merge."))
+        self.assertFalse(repo.merge_branches('feature', 'squash')[0])
+        
+        shell = CommandShell(repo)
+        shell.execute('checkout feature')
+        self.assertTrue(shell.execute('merge --ff-only master').startswith('Fast-forward'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import GitRepository
+from tests.support import random_history, repository_state
+
+class PersistenceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def path(self, name):
+        return os.path.join(self.directory, name)
+    
+    def test_json_round_trip(self):
+        for content_ids in (False, True):
+            repo = random_history(5, steps=3000, content_ids=content_ids)
+            repo.create_commit('quotes " and \\ backslashes, ünïcödé and\nnewlines')
+            repo.save_to_file(self.path('repo.json'))
+            loaded = GitRepository.load_from_file(self.path('repo.json'))
+            self.assertEqual(repository_state(loaded), repository_state(repo))
+    
+    def test_json_commits_may_come_before_their_parents(self):
+        repo = random_history(6)
+        repo.save_to_file(self.path('repo.json'))
+        with open(self.path('repo.json')) as f:
+            data = json.load(f)
+        data['commits'] = dict(reversed(list(data['commits'].items())))
+        with open(self.path('reversed.json'), 'w') as f:
+            json.dump(data, f)
+        loaded = GitRepository.load_from_file(self.path('reversed.json'))
+        self.assertEqual(repository_state(loaded)[1:], repository_state(repo)[1:])
+        self.assertEqual(sorted(repository_state(loaded)[0]), sorted(repository_state(repo)[0]))
+        
+        del data['commits']['C0']
+        with open(self.path('orphan.json'), 'w') as f:
+            json.dump(data, f)
+        with self.assertRaises(ValueError):
+            GitRepository.load_from_file(self.path('orphan.json'))
+    
+    def test_binary_round_trip(self):
+        for content_ids in (False, True):
+            repo = random_history(7, steps=3000, content_ids=content_ids)
+            repo.create_commit('quotes " and \\ backslashes, ünïcödé and\nnewlines')
+            repo.save_to_file(self.path('repo.bin'))
+            loaded = GitRepository.load_from_file(self.path('repo.bin'))
+            self.assertEqual(repository_state(loaded), repository_state(repo))
+            
+            # The mapped store becomes an ordinary one on the first new commit
+            loaded.create_commit('after loading')
+            repo.create_commit('after loading')
+            self.assertEqual(repository_state(loaded)[0][:-1], repository_state(repo)[0][:-1])
+            self.assertEqual(loaded.commits.commit(loaded.commit_count - 1).message, 'after loading')
+    
+    def test_binary_file_is_smaller_than_json(self):
+        repo = random_history(8, steps=2000)
+        repo.save_to_file(self.path('repo.json'))
+        repo.save_to_file(self.path('repo.bin'))
+        self.assertLess(os.path.getsize(self.path('repo.bin')), os.path.getsize(self.path('repo.json')))
+
+if __name__ == '__main__':
+    unittest.main()
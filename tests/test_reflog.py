@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import CommandShell, GitRepository, Reflog
+
+class ReflogRingTest(unittest.TestCase):
+    def test_ring_keeps_the_newest_entries(self):
+        reflog = Reflog(capacity=4)
+        for index in range(10):
+            reflog.append(index, 'commit', index * 10)
+        self.assertEqual(len(reflog), 4)
+        self.assertEqual(reflog.total, 10)
+        self.assertEqual([reflog.entry(n) for n in range(4)],
+                         [(9, 'commit', 90), (8, 'commit', 80), (7, 'commit', 70), (6, 'commit', 60)])
+        with self.assertRaises(IndexError):
+            reflog.entry(4)
+    
+    def test_frozen_view_ignores_later_entries(self):
+        reflog = Reflog(capacity=4)
+        for index in range(5):
+            reflog.append(index, 'commit', 0)
+        frozen = reflog.frozen()
+        reflog.append(5, 'merge', 0)
+        reflog.append(6, 'merge', 0)
+        self.assertEqual(len(frozen), 4)
+        self.assertEqual([frozen.entry(n)[0] for n in range(2)], [4, 3])
+        # The ring has overwritten the older entries the view knew of
+        with self.assertRaises(IndexError):
+            frozen.entry(2)
+        
+        reflog.forget(4)
+        self.assertEqual(frozen.entry(0)[0], 4)
+        self.assertEqual(reflog.entry(2)[0], -1)
+
+class ReflogTest(unittest.TestCase):
+    def test_previous_heads_resolve(self):
+        repo = GitRepository()
+        repo.create_commit('a')
+        repo.create_commit('b')
+        repo.create_branch('x')
+        repo.checkout_branch('x')
+        self.assertEqual(repo.resolve_commit('master@{1}'), 'C1')
+        self.assertEqual(repo.resolve_commit('HEAD@{0}'), 'C2')
+        self.assertEqual(repo.resolve_commit('@{3}'), 'C0')
+        self.assertIsNone(repo.resolve_commit('master@{3}'))
+        self.assertIsNone(repo.resolve_commit('nope@{0}'))
+        
+        shell = CommandShell(repo)
+        self.assertEqual(shell.execute('reflog -n 2'), "C2 HEAD@{0}: checkout\nC2 HEAD@{1}: commit: b")
+        self.assertEqual(shell.execute('reflog -n -1'), "Error: Invalid value for -n")
+        self.assertEqual(shell.execute('checkout master@{1}'), "HEAD is now at C1")
+    
+    def test_replaced_commits_are_gone(self):
+        repo = GitRepository()
+        repo.create_commit('a')
+        repo.undo()
+        repo.create_commit('b')
+        self.assertIn('(gone)  master@{2}: commit', repo.get_reflog('master'))
+        self.assertIsNone(repo.resolve_commit('master@{2}'))
+    
+    def test_only_the_newest_entries_are_kept(self):
+        repo = GitRepository()
+        for step in range(repo.REFLOG_SIZE + 10):
+            repo.create_commit(f"commit {step}")
+        last = repo.REFLOG_SIZE - 1
+        self.assertEqual(repo.resolve_commit(f"master@{{{last}}}"), 'C11')
+        self.assertIsNone(repo.resolve_commit(f"master@{{{last + 1}}}"))
+    
+    def test_snapshot_reflogs_stay_as_they_were(self):
+        repo = GitRepository()
+        repo.create_commit('a')
+        repo.create_commit('b')
+        snapshot = repo.snapshot()
+        repo.undo()
+        repo.create_commit('c')
+        # The snapshot still reads C2 as the commit 'c' replaced
+        self.assertEqual(snapshot.resolve_commit('master@{0}'), 'C2')
+        self.assertEqual(snapshot.commits.commit(2).message, 'b')
+        self.assertEqual(snapshot.resolve_commit('HEAD@{1}'), 'C1')
+        self.assertIsNone(snapshot.resolve_commit('HEAD@{3}'))
+        self.assertEqual(repo.resolve_commit('master@{0}'), 'C2')
+        self.assertEqual(repo.commits.commit(2).message, 'c')
+    
+    def test_loaded_repository_starts_a_reflog(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name in ('repo.json', 'repo.bin'):
+                filename = os.path.join(directory, name)
+                GitRepository().save_to_file(filename)
+                loaded = GitRepository.load_from_file(filename)
+                self.assertEqual(loaded.get_reflog(), "C0 HEAD@{0}: load")
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
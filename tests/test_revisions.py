@@ -0,0 +1,69 @@
+import random
+import unittest
+
+from main import CommandShell, GitRepository, parse_range, resolve_revision
+from tests.support import all_ancestors, random_history
+
+class RevisionTest(unittest.TestCase):
+    def setUp(self):
+        self.repos = [random_history(seed) for seed in range(4)]
+    
+    def test_walk_range(self):
+        rng = random.Random(1)
+        for repo in self.repos:
+            commits = repo.commits
+            ancestors = all_ancestors(commits)
+            for _ in range(100):
+                a, b = rng.randrange(len(commits)), rng.randrange(len(commits))
+                walked = list(commits.walk_range(b, a))
+                self.assertEqual(sorted(walked), sorted(ancestors[b] - ancestors[a]))
+                generations = [commits.generations[index] for index in walked]
+                self.assertEqual(generations, sorted(generations, reverse=True))
+                symmetric = commits.walk_range(b, a, symmetric=True)
+                self.assertEqual(sorted(symmetric), sorted(ancestors[a] ^ ancestors[b]))
+    
+    def test_revision_steps(self):
+        rng = random.Random(2)
+        repo = self.repos[0]
+        commits = repo.commits
+        for _ in range(200):
+            index = rng.randrange(len(commits))
+            steps = rng.randrange(commits.depths[index] + 1)
+            expected = index
+            for _ in range(steps):
+                expected = commits.parents[expected]
+            self.assertEqual(resolve_revision(repo, f"{commits.id_of(index)}~{steps}"), expected)
+            self.assertEqual(resolve_revision(repo, commits.id_of(index) + '^' * steps), expected)
+        with self.assertRaises(ValueError):
+            resolve_revision(repo, 'C0~1')
+    
+    def test_parents_and_ranges(self):
+        repo = GitRepository()
+        repo.create_branch('feature')
+        repo.checkout_branch('feature')
+        repo.create_commit('on feature')
+        repo.checkout_branch('master')
+        repo.create_commit('on master')
+        repo.merge_branches('feature', 'no-ff')
+        self.assertEqual(repo.resolve_commit('HEAD^'), 'C2')
+        self.assertEqual(repo.resolve_commit('@^2'), 'C1')
+        self.assertEqual(repo.resolve_commit('master^0'), 'C3')
+        self.assertEqual(repo.resolve_commit('master^2~1'), 'C0')
+        self.assertIsNone(repo.resolve_commit('C1^2'))
+        
+        self.assertEqual(parse_range('a..b'), ('a', 'b', False))
+        self.assertEqual(parse_range('a...'), ('a', 'HEAD', True))
+        self.assertIsNone(parse_range('a.b'))
+    
+    def test_checkout_of_head_changes_nothing(self):
+        shell = CommandShell()
+        shell.execute('commit a')
+        for revision in ('HEAD', '@'):
+            self.assertEqual(shell.execute(f"checkout {revision}"), "Already on 'master'")
+        self.assertEqual(shell.execute('checkout HEAD~1'), "HEAD is now at C0")
+        self.assertEqual(shell.repo.current_branch, 'HEAD')
+        self.assertEqual(shell.execute('checkout master'), "Switched to branch 'master'")
+        self.assertNotIn('HEAD', shell.repo.branches)
+
+if __name__ == '__main__':
+    unittest.main()
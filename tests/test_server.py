@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from server import _sandbox_command, run_shard
+
+class SandboxTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_other_commands_pass_through(self):
+        for command in ('commit hello world', 'log -n 5', 'stats', 'stats profile 3', ''):
+            self.assertEqual(_sandbox_command(command, 'alice', None), command)
+    
+    def test_file_commands_need_a_data_dir(self):
+        for command in ('save x.json', 'save', 'load x.json', 'autosave x.bin', 'stats export s.csv'):
+            self.assertIsNone(_sandbox_command(command, 'alice', None))
+    
+    def test_files_stay_in_the_session_directory(self):
+        saved = _sandbox_command('save ../../etc/passwd', 'alice', self.directory).split()
+        session_dir = os.path.dirname(saved[1])
+        self.assertEqual(os.path.dirname(session_dir), self.directory)
+        self.assertEqual(os.path.basename(saved[1]), 'passwd')
+        self.assertTrue(os.path.isdir(session_dir))
+        
+        self.assertEqual(_sandbox_command('save', 'alice', self.directory),
+                         f"save {os.path.join(session_dir, 'git_repo.json')}")
+        self.assertEqual(_sandbox_command('autosave off', 'alice', self.directory), 'autosave off')
+        self.assertEqual(_sandbox_command('stats export /tmp/s.csv', 'alice', self.directory),
+                         f"stats export {os.path.join(session_dir, 's.csv')}")
+        
+        # Names that only differ in characters left out of the directory name stay apart
+        other = _sandbox_command('save x.json', 'al/ice', self.directory).split()[1]
+        self.assertNotEqual(os.path.dirname(other), session_dir)
+    
+    def test_shard_keeps_sessions_apart(self):
+        conn, shard_conn = multiprocessing.Pipe()
+        thread = threading.Thread(target=run_shard, args=(shard_conn, self.directory, 100), daemon=True)
+        thread.start()
+        try:
+            requests = [('alice', 'commit one'), ('bob', 'log'), ('alice', 'save repo.json'),
+                        ('bob', 'load repo.json'), ('alice', None)]
+            replies = []
+            for request_id, (session, command) in enumerate(requests):
+                conn.send((request_id, session, command))
+                replies.append(conn.recv())
+            self.assertEqual([request_id for request_id, _ in replies], list(range(len(requests))))
+            outputs = [output for _, output in replies]
+            self.assertNotIn('one', outputs[1])
+            self.assertTrue(outputs[2].startswith('Repository saved to ' + self.directory))
+            self.assertTrue(outputs[3].startswith('Error'))
+            self.assertEqual(outputs[4], "Session closed")
+        finally:
+            conn.close()
+            thread.join(5)
+
+if __name__ == '__main__':
+    unittest.main()
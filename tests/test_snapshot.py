@@ -0,0 +1,73 @@
+import threading
+import unittest
+
+from main import GitRepository
+from tests.support import random_history
+
+def snapshot_state(snapshot):
+    return ([commit.id for commit in snapshot.iter_commits(order='topo')],
+            {name: branch.head for name, branch in snapshot.branches.items()},
+            snapshot.current_branch, snapshot.commit_count)
+
+class SnapshotTest(unittest.TestCase):
+    def test_snapshot_is_reused_until_a_change(self):
+        repo = GitRepository()
+        snapshot = repo.snapshot()
+        self.assertIs(repo.snapshot(), snapshot)
+        repo.create_commit('a')
+        self.assertIsNot(repo.snapshot(), snapshot)
+    
+    def test_snapshot_ignores_later_changes(self):
+        repo = random_history(12)
+        snapshot = repo.snapshot()
+        before = snapshot_state(snapshot)
+        head = repo.branches[repo.current_branch].head
+        
+        repo.create_branch('later')
+        repo.checkout_branch('later')
+        repo.create_commit('one')
+        repo.create_commit('two')
+        repo.undo()
+        repo.undo()
+        repo.create_commit('replaces the undone commits')
+        repo.checkout_branch('master')
+        repo.merge_branches('later', 'no-ff')
+        
+        self.assertEqual(snapshot_state(snapshot), before)
+        self.assertEqual(snapshot.resolve_commit(before[2]), head)
+        self.assertIsNone(snapshot.resolve_commit('later'))
+    
+    def test_readers_alongside_a_writer(self):
+        repo = GitRepository()
+        stop = threading.Event()
+        
+        def write():
+            step = 0
+            while not stop.is_set():
+                step += 1
+                repo.create_branch(f"f{step}")
+                repo.checkout_branch(f"f{step}")
+                repo.create_commit('feature')
+                repo.checkout_branch('master')
+                repo.create_commit('main')
+                repo.merge_branches(f"f{step}", 'no-ff')
+                if step % 3 == 0:
+                    repo.undo()
+        
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(50):
+                snapshot = repo.snapshot()
+                count = snapshot.commit_count
+                for branch in snapshot.branches.values():
+                    self.assertLess(snapshot.commits.index_of(branch.head), count)
+                log = [commit.index for commit in snapshot.iter_commits(order='topo')]
+                self.assertTrue(all(index < count for index in log))
+                self.assertEqual(snapshot_state(snapshot)[0], [snapshot.commits.id_of(index) for index in log])
+        finally:
+            stop.set()
+            writer.join()
+
+if __name__ == '__main__':
+    unittest.main()
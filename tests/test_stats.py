@@ -0,0 +1,89 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import CommandShell, CommandStats
+
+class CommandStatsTest(unittest.TestCase):
+    def test_summary(self):
+        stats = CommandStats()
+        for ms in range(1, 21):
+            stats.records.append({'command': 'commit', 'time': 0, 'total': ms / 1000,
+                                  'phases': {'command': ms / 2000}, 'alloc': {}})
+        rows = {row['phase']: row for row in stats.summary()}
+        self.assertEqual(rows['total']['count'], 20)
+        self.assertAlmostEqual(rows['total']['mean_ms'], 10.5)
+        self.assertAlmostEqual(rows['total']['p95_ms'], 19)
+        self.assertAlmostEqual(rows['total']['max_ms'], 20)
+        self.assertAlmostEqual(rows['command']['p95_ms'], 9.5)
+        self.assertIsNone(rows['command']['peak_kib'])
+    
+    def test_commands_are_timed_by_phase(self):
+        shell = CommandShell()
+        self.assertEqual(shell.execute('stats'), "No commands recorded yet")
+        shell.execute('commit a')
+        record = shell.stats.records[-1]
+        self.assertEqual(record['command'], 'commit')
+        self.assertIn('command', record['phases'])
+        self.assertGreaterEqual(record['total'], record['phases']['command'])
+        
+        # An outer caller that began the record keeps it
+        self.assertTrue(shell.stats.begin('gui'))
+        shell.execute('commit b')
+        with shell.stats.phase('render'):
+            pass
+        record = shell.stats.end()
+        self.assertEqual(record['command'], 'gui')
+        self.assertEqual(set(record['phases']), {'command', 'render'})
+    
+    def test_allocation_tracing(self):
+        shell = CommandShell()
+        shell.execute('stats alloc on')
+        try:
+            shell.execute('commit a')
+            self.assertIn('command', shell.stats.records[-1]['alloc'])
+        finally:
+            shell.execute('stats alloc off')
+        shell.execute('commit b')
+        self.assertEqual(shell.stats.records[-1]['alloc'], {})
+    
+    def test_profiles_keep_the_slowest_commands(self):
+        shell = CommandShell()
+        self.assertEqual(shell.execute('stats profile 0'), "Error: Profile count must be a positive number")
+        shell.execute('stats profile 2')
+        for step in range(6):
+            shell.execute(f"commit {step}")
+        kept = sorted(seconds for seconds, _, _, _ in shell.stats._profiles)
+        self.assertEqual(len(kept), 2)
+        totals = sorted(record['total'] for record in shell.stats.records if record['command'] != 'stats')
+        self.assertEqual(kept, totals[-2:])
+        self.assertTrue(shell.execute('stats profile show').startswith('== '))
+        shell.execute('stats profile off')
+        self.assertEqual(shell.execute('stats profile show'), "No profiles captured")
+    
+    def test_export(self):
+        directory = tempfile.mkdtemp()
+        try:
+            shell = CommandShell()
+            shell.execute('commit a')
+            shell.execute('commit b')
+            csv_file, json_file = os.path.join(directory, 's.csv'), os.path.join(directory, 's.json')
+            self.assertEqual(shell.execute(f"stats export {csv_file}"), f"Exported 2 command records to {csv_file}")
+            with open(csv_file, newline='') as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(rows[0], ['command', 'time', 'phase', 'seconds', 'peak_bytes'])
+            self.assertEqual([row[2] for row in rows[1:]], ['total', 'command'] * 2)
+            
+            shell.execute(f"stats export {json_file}")
+            with open(json_file) as f:
+                data = json.load(f)
+            self.assertEqual(len(data['records']), 3)
+            self.assertTrue(shell.execute(f"stats export {directory}/missing/s.csv").startswith('Error'))
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
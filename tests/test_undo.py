@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import CommandShell, GitRepository
+from tests.support import repository_state
+
+class UndoTest(unittest.TestCase):
+    def test_undo_redo_restores_states(self):
+        repo = GitRepository()
+        states = [repository_state(repo)]
+        for step in [lambda: repo.create_commit('a'), lambda: repo.create_branch('f'),
+                     lambda: repo.checkout_branch('f'), lambda: repo.create_commit('b'),
+                     lambda: repo.checkout_branch('master'), lambda: repo.merge_branches('f', 'no-ff')]:
+            step()
+            states.append(repository_state(repo))
+        for state in reversed(states[:-1]):
+            self.assertTrue(repo.undo()[0])
+            self.assertEqual(repository_state(repo), state)
+        self.assertFalse(repo.undo()[0])
+        for state in states[1:]:
+            self.assertTrue(repo.redo()[0])
+            self.assertEqual(repository_state(repo), state)
+        self.assertFalse(repo.redo()[0])
+    
+    def test_commit_after_undo_replaces_undone_commits(self):
+        repo = GitRepository()
+        repo.create_commit('a')
+        repo.create_commit('b')
+        repo.undo()
+        repo.create_commit('c')
+        self.assertEqual(len(repo.commits), 3)
+        self.assertEqual(repo.commits.commit(2).message, 'c')
+        self.assertFalse(repo.redo()[0])
+    
+    def test_journal_follows_undo_and_redo(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'auto.bin')
+            shell = CommandShell()
+            for command in [f"autosave {filename}", 'commit a', 'commit b', 'branch x', 'undo', 'undo', 'undo']:
+                shell.execute(command)
+            # The journal restarts with only the current commits; redo brings the rest back
+            shell.journal.compact()
+            for command in ['redo', 'redo', 'redo']:
+                shell.execute(command)
+            loaded = GitRepository.load_from_file(filename)
+            self.assertEqual(repository_state(loaded), repository_state(shell.repo))
+            
+            shell.execute('undo')
+            shell.execute('commit c')
+            shell.journal.close()
+            loaded = GitRepository.load_from_file(filename)
+            self.assertEqual(repository_state(loaded), repository_state(shell.repo))
+        finally:
+            shutil.rmtree(directory)
+    
+    def test_steps_that_change_nothing_are_not_recorded(self):
+        repo = GitRepository()
+        repo.create_commit('a')
+        repo.checkout_branch('C1')
+        self.assertTrue(repo.checkout_branch('C1')[0])
+        repo.checkout_branch('HEAD')
+        self.assertEqual(repo.undo()[1], "Undid checkout; 'master' is at C1")
+        self.assertEqual(repo.undo()[1], "Undid commit; 'master' is at C0")
+        self.assertFalse(repo.undo()[0])
+    
+    def test_undone_commits_are_left_out(self):
+        repo = GitRepository()
+        repo.create_commit('a')
+        repo.create_commit('b')
+        repo.undo()
+        self.assertEqual(repo.commit_count, 2)
+        self.assertEqual(repo.commit_ids(), {'C0', 'C1'})
+        self.assertIsNone(repo.resolve_commit('C2'))
+        self.assertEqual([commit.id for commit in repo.iter_commits()], ['C1', 'C0'])
+
+if __name__ == '__main__':
+    unittest.main()